@@ -5,9 +5,17 @@ from crewai import Agent, Crew, Task, Process
 from crewai_tools import SerperDevTool
 import markdown
 import os
+import sys
+
+# jobs.py (POST /jobs, GET /jobs/{job_id}) is shared with the apps at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from jobs import register_job_routes  # noqa: E402
 
 # Set your API Key for SerperDevTool (Search Tool)
-search_tools = SerperDevTool(api_key=os.getenv("SERPER_API_KEY"))
+search_tools = SerperDevTool(
+    api_key=os.getenv("SERPER_API_KEY"),
+    base_url=os.getenv("SERPER_BASE_URL", "https://google.serper.dev"),  # local stand-in for load tests
+)
 
 app = FastAPI()
 
@@ -326,10 +334,15 @@ async def set_task(request: TaskRequest):
     )
 
     # Start the workflow
-    result = crew.kickoff()
+    # kickoff_async runs the crew in a worker thread so the event loop stays free
+    result = await crew.kickoff_async()
     html_result = markdown.markdown(str(result))
 
     return {
         "message": "Task completed!",
         "result": str(html_result)
     }
+
+
+# ---------- Job mode: POST /jobs, GET /jobs/{job_id} ----------
+job_store = register_job_routes(app, TaskRequest, set_task)
@@ -0,0 +1,201 @@
+"""
+Record and replay the LLM and Serper calls of a crew run.
+
+In "record" mode every LLM call (crewai LLM.call) and every Serper HTTP request
+(requests or httpx.AsyncClient) goes out as usual and its answer is stored. In
+"replay" mode the same calls are answered from the cassette file without any
+network access, so a crew run is fast and deterministic.
+
+    with Cassette("cassettes/trip.json", mode="record") as cassette:
+        result = Trip().crew().kickoff(inputs=inputs)
+        cassette.meta["output"] = result.raw
+
+Calls are matched by content (model + messages, or Serper endpoint + payload),
+not by order, so crews that run tasks concurrently replay correctly. A call
+that was made several times is answered in the recorded order.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from crewai import LLM
+
+# Serper may be reached through SERPER_BASE_URL (fake or proxy) instead of the public host
+SERPER_HOSTS = {"google.serper.dev", urlsplit(os.getenv("SERPER_BASE_URL", "https://google.serper.dev")).netloc}
+
+
+class CassetteMiss(Exception):
+    """A call during replay that is not in the cassette."""
+
+
+def _hash(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+def llm_key(model: str, messages) -> str:
+    if isinstance(messages, str):
+        messages = [{"role": "user", "content": messages}]
+    return _hash({"model": model, "messages": messages})
+
+
+def serper_key(method: str, url: str, body) -> str:
+    """
+    Key of a Serper request: method, path and JSON payload (host and API key are ignored).
+    """
+    if isinstance(body, bytes):
+        body = body.decode("utf-8")
+    if isinstance(body, str):
+        try:
+            body = json.loads(body)
+        except ValueError:
+            pass
+    return _hash({"method": method.upper(), "path": urlsplit(str(url)).path, "body": body})
+
+
+def is_serper(url) -> bool:
+    return urlsplit(str(url)).netloc in SERPER_HOSTS
+
+
+class Cassette:
+    """
+    A recorded crew run: LLM answers and Serper responses keyed by request, plus `meta`
+    (free-form, e.g. the inputs and the final output to check a replay against).
+
+    Use as a context manager; the patches are removed on exit and, when
+    recording, the file is written.
+    """
+
+    def __init__(self, path: str, mode: str = "replay"):
+        if mode not in ("record", "replay"):
+            raise ValueError("mode must be 'record' or 'replay'")
+        self.path = path
+        self.mode = mode
+        self.meta = {}
+        self.interactions = {"llm": {}, "serper": {}}
+        self.calls = {"llm": 0, "serper": 0}
+        self._cursor = {}
+        self._lock = threading.Lock()
+        self._restore = []
+        if mode == "replay":
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.meta = data.get("meta", {})
+            self.interactions = data["interactions"]
+
+    def __enter__(self):
+        self._patch_llm()
+        self._patch_requests()
+        self._patch_httpx()
+        return self
+
+    def __exit__(self, *exc_info):
+        for owner, name, original in reversed(self._restore):
+            setattr(owner, name, original)
+        self._restore.clear()
+        if self.mode == "record":
+            self.save()
+        return False
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        data = {
+            "version": 1,
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "meta": self.meta,
+            "interactions": self.interactions,
+        }
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+
+    def _record(self, kind: str, key: str, value):
+        with self._lock:
+            self.interactions[kind].setdefault(key, []).append(value)
+            self.calls[kind] += 1
+
+    def _replay(self, kind: str, key: str):
+        with self._lock:
+            answers = self.interactions[kind].get(key)
+            if not answers:
+                raise CassetteMiss(f"No recorded {kind} call with key {key[:12]} in {self.path}")
+            index = self._cursor.get((kind, key), 0)
+            self._cursor[(kind, key)] = index + 1
+            self.calls[kind] += 1
+            # a call repeated more often than recorded gets the last answer again
+            return answers[min(index, len(answers) - 1)]
+
+    def _patch(self, owner, name, replacement):
+        self._restore.append((owner, name, getattr(owner, name)))
+        setattr(owner, name, replacement)
+
+    def _patch_llm(self):
+        original = LLM.call
+        cassette = self
+
+        def call(llm, messages, *args, **kwargs):
+            key = llm_key(llm.model, messages)
+            if cassette.mode == "replay":
+                return cassette._replay("llm", key)
+            answer = original(llm, messages, *args, **kwargs)
+            cassette._record("llm", key, answer if isinstance(answer, str) else str(answer))
+            return answer
+
+        self._patch(LLM, "call", call)
+
+    def _patch_requests(self):
+        original = requests.Session.request
+        cassette = self
+
+        def request(session, method, url, *args, **kwargs):
+            if not is_serper(url):
+                return original(session, method, url, *args, **kwargs)
+            key = serper_key(method, url, kwargs.get("json", kwargs.get("data")))
+            if cassette.mode == "replay":
+                recorded = cassette._replay("serper", key)
+                response = requests.Response()
+                response.status_code = recorded["status"]
+                response._content = recorded["body"].encode("utf-8")
+                response.headers["Content-Type"] = recorded.get("content_type", "application/json")
+                response.encoding = "utf-8"
+                response.url = str(url)
+                return response
+            response = original(session, method, url, *args, **kwargs)
+            cassette._record("serper", key, {
+                "status": response.status_code,
+                "content_type": response.headers.get("Content-Type", "application/json"),
+                "body": response.text,
+            })
+            return response
+
+        self._patch(requests.Session, "request", request)
+
+    def _patch_httpx(self):
+        original = httpx.AsyncClient.send
+        cassette = self
+
+        async def send(client, request, *args, **kwargs):
+            if not is_serper(request.url):
+                return await original(client, request, *args, **kwargs)
+            key = serper_key(request.method, request.url, request.content)
+            if cassette.mode == "replay":
+                recorded = cassette._replay("serper", key)
+                return httpx.Response(
+                    recorded["status"],
+                    headers={"Content-Type": recorded.get("content_type", "application/json")},
+                    content=recorded["body"].encode("utf-8"),
+                    request=request,
+                )
+            response = await original(client, request, *args, **kwargs)
+            await response.aread()
+            cassette._record("serper", key, {
+                "status": response.status_code,
+                "content_type": response.headers.get("Content-Type", "application/json"),
+                "body": response.text,
+            })
+            return response
+
+        self._patch(httpx.AsyncClient, "send", send)
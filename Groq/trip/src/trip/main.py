@@ -1,7 +1,10 @@
 #!/usr/bin/env python
+import os
 import sys
+import time
 import warnings
 
+from trip.cassette import Cassette
 from trip.crew import Trip
 
 warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
@@ -18,4 +21,85 @@ def run():
     inputs = {
         'topic': 'AI LLMs'
     }
-    Trip().crew().kickoff(inputs=inputs)
\ No newline at end of file
+    Trip().crew().kickoff(inputs=inputs)
+
+
+def train():
+    """
+    Train the crew for a given number of iterations: train <n_iterations> <filename>
+    """
+    inputs = {
+        'topic': 'AI LLMs'
+    }
+    try:
+        Trip().crew().train(n_iterations=int(sys.argv[1]), filename=sys.argv[2], inputs=inputs)
+    except Exception as e:
+        raise Exception(f"An error occurred while training the crew: {e}")
+
+
+def record():
+    """
+    Run the crew against the real LLM and save every LLM/Serper call: record <cassette.json>
+    """
+    inputs = {
+        'topic': 'AI LLMs'
+    }
+    with Cassette(sys.argv[1], mode="record") as cassette:
+        start = time.perf_counter()
+        result = Trip().crew().kickoff(inputs=inputs)
+        cassette.meta.update(inputs=inputs, output=result.raw, seconds=round(time.perf_counter() - start, 2))
+    print(f"Recorded {cassette.calls['llm']} LLM and {cassette.calls['serper']} Serper calls to {sys.argv[1]}")
+
+
+def replay():
+    """
+    Run the crew offline from a cassette: replay <cassette.json>
+    Anything else is passed on as crewAI's own replay: replay <task_id>
+    """
+    if not os.path.isfile(sys.argv[1]):
+        try:
+            Trip().crew().replay(task_id=sys.argv[1])
+        except Exception as e:
+            raise Exception(f"An error occurred while replaying the crew: {e}")
+        return
+
+    result, seconds = _replay_cassette(sys.argv[1])
+    print(result.raw)
+    print(f"Replayed {sys.argv[1]} in {seconds:.2f}s")
+
+
+def test():
+    """
+    Regression test from a cassette: test <cassette.json> [n_iterations]
+    Replays the crew offline and fails if the output differs from the recorded one.
+    Anything else is passed on as crewAI's own test: test <n_iterations> <openai_model_name>
+    """
+    if not os.path.isfile(sys.argv[1]):
+        inputs = {
+            'topic': 'AI LLMs'
+        }
+        try:
+            Trip().crew().test(n_iterations=int(sys.argv[1]), openai_model_name=sys.argv[2], inputs=inputs)
+        except Exception as e:
+            raise Exception(f"An error occurred while testing the crew: {e}")
+        return
+
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    expected = Cassette(sys.argv[1]).meta.get("output")
+    failed = 0
+    for iteration in range(1, iterations + 1):
+        result, seconds = _replay_cassette(sys.argv[1])
+        ok = expected is None or result.raw == expected
+        failed += not ok
+        print(f"run {iteration}: {'ok' if ok else 'OUTPUT CHANGED'} in {seconds:.2f}s")
+    if failed:
+        sys.exit(1)
+
+
+def _replay_cassette(path: str):
+    with Cassette(path, mode="replay") as cassette:
+        # no real key is needed; every call is answered from the cassette
+        os.environ.setdefault("OPENAI_API_KEY", "replay")
+        start = time.perf_counter()
+        result = Trip().crew().kickoff(inputs=cassette.meta.get("inputs", {}))
+        return result, time.perf_counter() - start
@@ -1,23 +1,98 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from crewai import Agent, Crew, Task, Process
-from crewai_tools import SerperDevTool
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
 import markdown
 import os
-import requests
-import json
+import re
+
+from admission import AdmissionController
+from cache import SQLiteCache, canonical_key, hash_text, normalize_text
+from delivery import deliver, public_result
+from executors import run_blocking, run_crew
+from jobs import register_job_routes
+from metrics import Gauge, StageTimer, register_metrics_route, stage_timer
+from prewarm import PREWARM_TOP_N, Prewarmer, RequestStats
+from knowledge_index import LocalKnowledgeTool
+from llm_cache import agent_llm, llm_cache
+from progress import ProgressStream
+from rq_match import RqIndex
+from serper import SERPER_BASE_URL, CachedSerperDevTool, SerperError, search_cache, search_cache_key, serper_client
+from singleflight import SingleFlight
+from trip_schema import STRUCTURED_OUTPUT, Package, TripPlan, package_markdown, parse_package, writer_output
+from usage import BudgetExceeded, RequestUsage, current_usage
 
 SERPER_API_KEY = os.getenv("SERPER_API_KEY")
 if not SERPER_API_KEY:
 
     print("Warning: SERPER_API_KEY is not set. Please set it in your environment.")
     
-# ตั้งค่า SerperDevTool (Search Tool)
-search_tools = SerperDevTool(api_key=SERPER_API_KEY)
+# SERPER_BASE_URL ชี้ไปที่ Serper จำลอง (benchmarks/fake_serper.py) เพื่อทดสอบโหลดโดยไม่ใช้โควตา
+if SERPER_BASE_URL.rstrip("/") != "https://google.serper.dev":
+    print(f"Using Serper at {SERPER_BASE_URL}")
+
+# ตั้งค่า SerperDevTool (Search Tool) — ใช้ cache ร่วมกับ search_serper_async
+search_tools = CachedSerperDevTool(api_key=SERPER_API_KEY)
+
+# ค้นข้อมูลท่องเที่ยวจากไฟล์ใน KNOWLEDGE_DIR (BM25, ออฟไลน์) — ให้ researcher เฉพาะเมื่อ index มีเอกสาร
+knowledge_tool = LocalKnowledgeTool()
+
+
+def research_tools() -> list:
+    """
+    tools ของ researcher: เพิ่ม knowledge_tool เมื่อ KNOWLEDGE_DIR มีเอกสารท่องเที่ยว (ไม่งั้นเสีย step เปล่า ๆ)
+    """
+    if knowledge_tool.index.document_count():
+        return [knowledge_tool, search_tools]
+    return [search_tools]
+
+# Cache ผลลัพธ์ของทั้ง crew (ค่า TTL เป็นวินาที, 0 = ปิด cache)
+result_cache = SQLiteCache(
+    table="trip_results",
+    ttl=int(os.getenv("RESULT_CACHE_TTL", "86400")),
+    max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1000")),
+)
+
+# Cache ผล research (ขึ้นกับจังหวัด/สไตล์/งบ/จำนวนวันเท่านั้น) → คำขอที่ต่างกันแค่ adults/Rq รันแค่ writer
+research_cache = SQLiteCache(
+    table="research_results",
+    ttl=int(os.getenv("RESEARCH_CACHE_TTL", "86400")),
+    max_entries=int(os.getenv("RESEARCH_CACHE_MAX_ENTRIES", "1000")),
+)
+# research ของ key เดียวกันที่กำลังรันอยู่ ใช้ร่วมกัน
+research_inflight = SingleFlight()
+
+# Rq ของผลที่อยู่ใน cache → หาผลเดิมของ Rq ที่เขียนต่างกันเล็กน้อย (RQ_MATCH_THRESHOLD, 0 = ปิด)
+rq_index = RqIndex()
+
+# คำขอที่เหมือนกันและมาพร้อมกัน ใช้ crew ตัวเดียวกัน
+inflight = SingleFlight()
+
+# จำกัดจำนวนคำขอที่สร้าง crew พร้อมกัน ที่เหลือรอในคิวที่มีขนาดจำกัด (เต็ม → 429 + Retry-After)
+admission = AdmissionController()
+
+# นับจำนวนครั้งที่แต่ละคำขอถูกเรียก → ใช้จัดอันดับสำหรับ pre-warm
+request_stats = RequestStats()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # pre-warm คำขอยอดนิยมช่วง off-peak (เปิดเมื่อ PREWARM_TOP_N > 0)
+    prewarm_task = asyncio.create_task(build_prewarmer().loop()) if PREWARM_TOP_N > 0 else None
+    yield
+    if prewarm_task:
+        prewarm_task.cancel()
+    # ปิด connection pool ของ Serper ตอนปิด server
+    await serper_client.aclose()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Allow Frontend to call this API
 app.add_middleware(
@@ -26,6 +101,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Retry-After"],
 )
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -38,6 +114,11 @@ class TaskRequest(BaseModel):
     adults: str     
     Rq: str        
 
+
+class BatchRequest(BaseModel):
+    items: list[TaskRequest]
+    as_jobs: bool = False  # True = ตอบ job id ของแต่ละรายการทันที แทนการส่งผลแบบ stream
+
 # ---------- Task mapping for each province ----------
 task_mapping = {
     "All": {
@@ -168,6 +249,24 @@ task_mapping = {
     },
 }
 
+# จังหวัดที่ "All" ครอบคลุม และจำนวน research crew ที่รันพร้อมกันได้ตอน fan-out
+ALL_PROVINCES = ["Phatthalung", "Trang", "Satun", "Songkhla", "Yala"]
+FANOUT_PARALLELISM = int(os.getenv("FANOUT_PARALLELISM", "5"))
+
+# writer แบบขนาน: แยก 5 แพ็กเกจเป็น 5 crew ที่ใช้ research เดียวกันแล้วรันพร้อมกัน (PARALLEL_WRITER=1)
+PARALLEL_WRITER = os.getenv("PARALLEL_WRITER", "0").lower() in ("1", "true", "yes")
+# จุดเน้นสั้น ๆ ของแต่ละแพ็กเกจ (ตามลำดับ) เพื่อไม่ให้ 5 แพ็กเกจซ้ำกัน
+PACKAGE_HINTS = [
+    "the must-see highlights for first-time visitors",
+    "local food, markets and signature dishes",
+    "culture, history and temples",
+    "nature and outdoor activities at a relaxed pace",
+    "hidden gems and local experiences away from the crowds",
+]
+
+# research แยกหัวข้อ: researcher หนึ่งตัวต่อหัวข้อ รันพร้อมกัน และ cache ผลแต่ละหัวข้อแยกกัน (TOPIC_RESEARCH=1)
+TOPIC_RESEARCH = os.getenv("TOPIC_RESEARCH", "0").lower() in ("1", "true", "yes")
+
 # ---------- Data for Style, Cost, and Day mappings ----------
 style_mapping = {
     "Natural": {
@@ -258,150 +357,1053 @@ day_mapping = {
     },
 }
 
-def search_serper(query: str):
+# ---------- Prebuilt templates (built once at startup) ----------
+RESEARCHER_BACKSTORY = (
+    "You are an expert in researching travel information in Southern Thailand, "
+    "familiar with travel routes in every province in the region. "
+    "You can find the latest details (2024-2025) thoroughly."
+)
+WRITER_BACKSTORY = (
+    "You are an expert in planning tours throughout Southern Thailand. "
+    "You can create compelling tour packages with comprehensive details "
+    "and utilize the researcher's data effectively."
+)
+
+@dataclass(frozen=True)
+class ResearchTopic:
+    """
+    หัวข้อหนึ่งของ research แบบแยกหัวข้อ
+    fields คือฟิลด์ของคำขอที่ผลของหัวข้อนี้ขึ้นอยู่ (นอกจากจังหวัด) → ใช้ทำ cache key
+    เช่น การเดินทางไม่ขึ้นกับสไตล์/งบ จึงใช้ผลร่วมกันได้ทุกคำขอของจังหวัดเดียวกัน
+    """
+    name: str
+    focus: str
+    query: str
+    fields: tuple
+
+
+RESEARCH_TOPICS = [
+    ResearchTopic(
+        "attractions",
+        "tourist attractions, historical background and activities that suit the travel style, with entrance fees",
+        "Find tourist attractions and activities for a {style} trip in {province}, Thailand for {day} days",
+        ("style", "day"),
+    ),
+    ResearchTopic(
+        "food",
+        "recommended local food, signature dishes, restaurants and markets with typical prices",
+        "Find local food, signature dishes and restaurants in {province}, Thailand with a budget of {cost}",
+        ("cost",),
+    ),
+    ResearchTopic(
+        "lodging",
+        "accommodation options with their names, areas and nightly prices within the budget",
+        "Find accommodations in {province}, Thailand with a budget of {cost}",
+        ("cost",),
+    ),
+    ResearchTopic(
+        "transport",
+        "how to get there and get around: transportation options, travel times and costs",
+        "How to travel to and around {province}, Thailand",
+        (),
+    ),
+]
+
+
+@dataclass(frozen=True)
+class ProvinceTemplate:
+    """
+    ข้อความส่วนที่ไม่เปลี่ยนของ researcher, writer และ task ของแต่ละจังหวัด
+    เป็น frozen dataclass ของ str จึงใช้ร่วมกันระหว่าง request ที่รันพร้อมกันได้
+    ต่อ request จะ bind แค่ adults, Rq, style, cost, day แล้วสร้าง Agent/Task ใหม่
+    """
+    pv: str
+    researcher_goal: str
+    person: str
+    rq: str
+    research_description: str
+    writer_goal: str
+    writer_description: str
+    writer_expected_output: str
+
+    @property
+    def province(self) -> str:
+        """
+        ชื่อจังหวัดจาก pv ("Destination: Satun, Thailand" → "Satun"; "All" ได้รายชื่อทั้งห้าจังหวัด)
+        """
+        return self.pv.strip().removeprefix("Destination:").removesuffix(", Thailand").strip()
+
+    @classmethod
+    def from_mapping(cls, info: dict):
+        return cls(
+            pv=info["pv"],
+            researcher_goal=info["goal"],
+            person=info["person"],
+            rq=info["rq"],
+            research_description=(
+                "Conduct research on popular tourist attractions from 2024 to present (2025) in "
+                + info["pv"]
+                + "including activities, recommended foods, accommodations, and costs according to the budget, "
+                "while also considering the user's chosen travel style ("
+            ),
+            writer_goal=(
+                "Gather information from the researcher and create 5 travel packages "
+                "with schedules and full details for "
+                + info["pv"]
+            ),
+            writer_description=info["description"],
+            writer_expected_output=info["expected_output"],
+        )
+
+    def bind_researcher_goal(self, request, style_info, cost_info, day_info) -> str:
+        return "".join((
+            self.researcher_goal,
+            self.person.format(adults=request.adults),
+            self.rq.format(Rq=request.Rq),
+            style_info["description"],
+            cost_info["description"],
+            day_info["description"],
+        ))
+
+    def bind_shared_researcher_goal(self, style_info, cost_info, day_info) -> str:
+        """
+        goal ที่ไม่มีจำนวนคนและ Rq → research ใช้ร่วมกันได้ระหว่างคำขอที่ต่างกันแค่ฟิลด์ของ writer
+        """
+        return "".join((
+            self.researcher_goal,
+            style_info["description"],
+            cost_info["description"],
+            day_info["description"],
+        ))
+
+    def bind_research_description(self, request) -> str:
+        return self.research_description + request.style + ")."
+
+    def bind_writer_description(self, request) -> str:
+        return "".join((
+            self.writer_description,
+            "\n\n",
+            self.person.format(adults=request.adults),
+            self.rq.format(Rq=request.Rq),
+        ))
+
+    def bind_package_description(self, request, number: int, hint: str) -> str:
+        """
+        description ของ writer ที่เขียนแพ็กเกจเดียว (writer แบบขนาน)
+        """
+        return "".join((
+            self.bind_writer_description(request),
+            f"\nWrite ONLY Package {number} of {len(PACKAGE_HINTS)}; the other packages are written separately. ",
+            f"Focus of this package: {hint}. ",
+            f"Start with the heading \"## Package {number}: <package name>\".\n",
+        ))
+
+
+province_templates = {name: ProvinceTemplate.from_mapping(info) for name, info in task_mapping.items()}
+
+
+def format_search_results(query: str, data: dict) -> dict:
+    """
+    แปลงผลลัพธ์จาก Serper เป็น context สำหรับ research task
+    """
+    # ดึงข้อมูลจากผลลัพธ์ organic เท่านั้น
+    search_results = data.get("organic", [])
+
+    # แปลงเป็นข้อความที่สามารถใช้เป็น context
+    formatted_results = "\n".join([f"- {result['title']}: {result['link']}" for result in search_results])
+
+    return {
+        "description": f"ผลการค้นหาสำหรับ: {query}",
+        "expected_output": formatted_results
+    }
+
+
+async def search_serper_async(query: str):
     """
-    เรียกใช้งาน Serper (Google Search) และคืนค่าที่เหมาะสม
+    เรียกใช้งาน Serper (Google Search) ผ่าน async client บน event loop (ไม่กิน thread ระหว่างรอ Serper)
+    คำค้นเดิม (ไม่สนตัวพิมพ์/ช่องว่าง) ใช้ผลจาก cache ได้เลย
     """
     if not SERPER_API_KEY:
         raise HTTPException(status_code=400, detail="Serper API key not configured.")
 
-    url = "https://google.serper.dev/search"
-    payload = json.dumps({"q": query})
-    headers = {
-        'X-API-KEY': SERPER_API_KEY,
-        'Content-Type': 'application/json'
-    }
+    payload = {"q": query}
+    cache_key = search_cache_key("search", payload)
+    with stage_timer("search_serper"):
+        data = await run_blocking(search_cache.get, cache_key)
 
-    response = requests.post(url, headers=headers, data=payload)
-    if response.status_code == 200:
-        data = response.json()
-        
-        # ดึงข้อมูลจากผลลัพธ์ organic เท่านั้น
-        search_results = data.get("organic", [])
+        if data is None:
+            try:
+                data = await serper_client.asearch(payload)
+            except SerperError as e:
+                raise HTTPException(status_code=e.status_code, detail=str(e))
+            await run_blocking(search_cache.set, cache_key, data)
 
-        # แปลงเป็นข้อความที่สามารถใช้เป็น context
-        formatted_results = "\n".join([f"- {result['title']}: {result['link']}" for result in search_results])
+    return format_search_results(query, data)
 
-        return {
-            "description": f"ผลการค้นหาสำหรับ: {query}",
-            "expected_output": formatted_results
-        }
-    else:
-        raise HTTPException(status_code=response.status_code, detail="Search API request failed.")
 
+def validate_request(request: TaskRequest):
+    """
+    ตรวจสอบ province, style, cost, day กับ mapping → คืนค่าข้อมูลของแต่ละตัวเลือก
+    """
+    with stage_timer("validation"):
+        # 1) ตรวจสอบ province (task_type)
+        task_info = province_templates.get(request.task_type)
+        if not task_info:
+            raise HTTPException(status_code=400, detail="Invalid task type")
 
-@app.post("/set_task")
-async def set_task(request: TaskRequest):
+        # 2) ตรวจสอบ style, cost, day
+        style_info = style_mapping.get(request.style)
+        if not style_info:
+            raise HTTPException(status_code=400, detail="Invalid style option")
+
+        cost_info = cost_mapping.get(request.cost)
+        if not cost_info:
+            raise HTTPException(status_code=400, detail="Invalid cost option")
+
+        day_info = day_mapping.get(request.day)
+        if not day_info:
+            raise HTTPException(status_code=400, detail="Invalid day option")
+
+    return task_info, style_info, cost_info, day_info
+
+
+def request_cache_key(request: TaskRequest) -> str:
     """
-    รับ Task จาก Frontend → สร้าง CrewAI workflow → ส่งผลลัพธ์กลับ
+    Key ของ result cache: ตัวเลือกจาก mapping + จำนวนคนเป็นตัวเลข + hash ของ Rq ที่ normalize แล้ว
     """
-    
+    adults = normalize_text(request.adults)
+    try:
+        adults = int(adults)
+    except ValueError:
+        pass
+    return canonical_key({
+        "task_type": request.task_type,
+        "style": request.style,
+        "cost": request.cost,
+        "day": request.day,
+        "adults": adults,
+        "rq": hash_text(normalize_text(request.Rq)),
+    })
 
-    # 1) ตรวจสอบ province (task_type)
-    task_info = task_mapping.get(request.task_type)
-    if not task_info:
-        raise HTTPException(status_code=400, detail="Invalid task type")
 
-    # 2) ตรวจสอบ style, cost, day
-    style_info = style_mapping.get(request.style)
-    if not style_info:
-        raise HTTPException(status_code=400, detail="Invalid style option")
+def rq_group_key(request: TaskRequest) -> str:
+    """
+    Key ของทุกฟิลด์ยกเว้น Rq: ผลที่จะใช้แทนกันได้ต้องมีจังหวัด/สไตล์/งบ/จำนวนวัน/จำนวนคนตรงกัน
+    """
+    return request_cache_key(request.model_copy(update={"Rq": ""}))
 
-    cost_info = cost_mapping.get(request.cost)
-    if not cost_info:
-        raise HTTPException(status_code=400, detail="Invalid cost option")
 
-    day_info = day_mapping.get(request.day)
-    if not day_info:
-        raise HTTPException(status_code=400, detail="Invalid day option")
+async def record_request(request: TaskRequest):
+    """
+    นับคำขอใน request_stats ตามกลุ่ม (ไม่เก็บข้อความ Rq) → pre-warm สร้างผลของกลุ่มโดยไม่มี Rq
+    ซึ่งเติม research cache ที่คำขอทุก Rq ในกลุ่มใช้ร่วมกันด้วย
+    """
+    group = request.model_copy(update={"Rq": ""})
+    await run_blocking(request_stats.record, request_cache_key(group), group.model_dump())
 
-    # 3) สร้าง Researcher Agent
-    researcher = Agent(
+
+async def cached_result(request: TaskRequest, cache_key: str):
+    """
+    ผลจาก result cache: key ตรงกันก่อน ถ้าไม่มีจึงหาผลของ Rq ที่ใกล้เคียงกัน
+    ("vegetarian food please" ≈ "Vegetarian food.") ในกลุ่มเดียวกัน
+    """
+    cached = await run_blocking(result_cache.get, cache_key)
+    if cached is not None or not rq_index.enabled:
+        return cached
+    for score, match_key, rq in await run_blocking(rq_index.matches, rq_group_key(request), request.Rq):
+        cached = await run_blocking(result_cache.get, match_key)
+        if cached is not None:
+            return dict(cached, rq_match={"rq": rq, "score": round(score, 3)})
+    return None
+
+
+def is_fanout(request: TaskRequest) -> bool:
+    """
+    "All" แยก research เป็นรายจังหวัดแล้วรันพร้อมกัน (ปิดได้ด้วย FANOUT_PARALLELISM=0)
+    """
+    return request.task_type == "All" and FANOUT_PARALLELISM > 0
+
+
+def build_search_query(request: TaskRequest, task_info: ProvinceTemplate, shared: bool = False) -> str:
+    """
+    สร้างคำค้นหาเบื้องต้นสำหรับ search_serper_async (shared=True ไม่ใส่จำนวนคน)
+    """
+    query = (
+        f"Find tourist attractions, activities, accommodations, and foods for a {request.style} trip in "
+        f"{task_info.pv} with a budget of {request.cost} for {request.day} days"
+    )
+    if shared:
+        return query + "."
+    return query + f", considering the number of travelers ({request.adults} adults)."
+
+
+def build_researcher(request: TaskRequest, task_info: ProvinceTemplate, style_info, cost_info, day_info, progress=None,
+                     shared: bool = False):
+    """
+    สร้าง Researcher Agent ของจังหวัดใน task_info
+    shared=True: goal ไม่ผูกกับจำนวนคน/Rq เพื่อใช้ผล research ร่วมกันได้
+    """
+    if shared:
+        goal = task_info.bind_shared_researcher_goal(style_info, cost_info, day_info)
+    else:
+        goal = task_info.bind_researcher_goal(request, style_info, cost_info, day_info)
+    return Agent(
         role="Thai Tour Researcher",
-        goal=(
-            task_info["goal"]
-            + task_info["person"].format(adults=request.adults)
-            + task_info["rq"].format(Rq=request.Rq)
-            + style_info["description"]
-            + cost_info['description']
-            + day_info['description']
-        ),
-        backstory=(
-            "You are an expert in researching travel information in Southern Thailand, "
-            "familiar with travel routes in every province in the region. "
-            "You can find the latest details (2024-2025) thoroughly."
-        ),
-        tools=[search_tools],  # researcher สามารถใช้เซิร์จได้
+        goal=goal,
+        backstory=RESEARCHER_BACKSTORY,
+        tools=research_tools(),
+        llm=agent_llm("researcher"),  # ใช้ cache ของ LLM call ถ้าเปิดไว้ใน LLM_CACHE_AGENTS
+        step_callback=progress.step_callback("researcher") if progress else None,
         verbose=True
     )
 
-    # 4) สร้าง Trip Planner (Writer) Agent
-    writer = Agent(
+
+def build_writer(task_info: ProvinceTemplate, progress=None):
+    """
+    สร้าง Trip Planner (Writer) Agent
+    """
+    return Agent(
         role="Trip Planner",
-        goal=(
-            "Gather information from the researcher and create 5 travel packages "
-            "with schedules and full details for "
-            + task_info["pv"]
-        ),
-        backstory=(
-            "You are an expert in planning tours throughout Southern Thailand. "
-            "You can create compelling tour packages with comprehensive details "
-            "and utilize the researcher's data effectively."
-        ),
+        goal=task_info.writer_goal,
+        backstory=WRITER_BACKSTORY,
+        llm=agent_llm("writer"),
+        step_callback=progress.step_callback("writer") if progress else None,
         verbose=True
     )
 
-    # ค้นหาข้อมูลเบื้องต้นตรงนี้ เพื่อนำไปใส่ใน context
-    query = (
-        f"Find tourist attractions, activities, accommodations, and foods for a {request.style} trip in "
-        f"{task_info['pv']} with a budget of {request.cost} for {request.day} days, "
-        f"considering the number of travelers ({request.adults} adults)."
-    )
-    search_results = search_serper(query)
 
-    # 6) สร้าง Task สำหรับ Researcher
-    research_task = Task(
+def build_research_task(request: TaskRequest, task_info: ProvinceTemplate, researcher, search_results):
+    """
+    สร้าง Task สำหรับ Researcher
+    """
+    return Task(
         agent=researcher,
-        description=(
-            "Conduct research on popular tourist attractions from 2024 to present (2025) in "
-            + task_info["pv"]
-            + "including activities, recommended foods, accommodations, and costs according to the budget, "
-            "while also considering the user's chosen travel style ("
-            + request.style
-            + ")."
-        ),
+        description=task_info.bind_research_description(request),
         expected_output=(
             "Information on tourist attractions, historical background, activities, prices, "
             "accommodation (including names), recommended foods, and transportation, "
             f"aligned with the budget: {request.cost}, day(s): {request.day}."
         ),
-        tools=[search_tools],
+        tools=research_tools(),
         context=[search_results],
         # output_file='./output/research/research_output.md'
     )
 
+
+def build_crew(request: TaskRequest, task_info, style_info, cost_info, day_info, search_results, progress=None,
+               timer: StageTimer = None):
+    """
+    สร้าง Researcher + Writer และ Task ทั้งสอง → รวมเป็น Crew
+    progress (ProgressStream) ใช้รับ step/task callback สำหรับ /set_task/stream
+    timer (StageTimer) จับเวลา research/writer แยกกันจาก task_callback (ต่อ progress ไว้ใน timer.then)
+    """
+    # 3) สร้าง Researcher Agent
+    researcher = build_researcher(request, task_info, style_info, cost_info, day_info, progress)
+
+    # 4) สร้าง Trip Planner (Writer) Agent
+    writer = build_writer(task_info, progress)
+
+    # 6) สร้าง Task สำหรับ Researcher
+    research_task = build_research_task(request, task_info, researcher, search_results)
+
     # 7) สร้าง Task สำหรับ Writer
     writer_task = Task(
         agent=writer,
-        description=task_info["description"],
-        expected_output=task_info["expected_output"],
+        description=task_info.writer_description,
+        expected_output=task_info.writer_expected_output,
+        output_pydantic=TripPlan if STRUCTURED_OUTPUT else None,  # STRUCTURED_OUTPUT=1 → JSON ตาม TripPlan
         context=[research_task],  # ดึงผลจาก researcher
         # output_file='./output/writer/writer_output.md'
     )
 
     # 8) รวม Task ไว้ใน Crew
-    crew = Crew(
+    return Crew(
         agents=[researcher, writer],
         tasks=[research_task, writer_task],
         process=Process.sequential,
+        task_callback=timer.task_callback if timer else (progress.task_callback if progress else None),
+        before_kickoff_callbacks=[timer.before_kickoff] if timer else [],
     )
 
-    # 9) สั่งทำงาน
-    result = crew.kickoff()
 
-    html_result = markdown.markdown(str(result))  # แปลง Markdown เป็น HTML
+async def run_research_fanout(request: TaskRequest, style_info, cost_info, day_info, progress=None,
+                              shared: bool = False) -> str:
+    """
+    "All": รัน research crew แยกจังหวัดละหนึ่ง crew พร้อมกัน (ไม่เกิน FANOUT_PARALLELISM)
+    แล้วรวมผลทุกจังหวัดตามลำดับใน ALL_PROVINCES
+    """
+    slots = asyncio.Semaphore(FANOUT_PARALLELISM)
 
-    return {
+    async def research(province):
+        async with slots:
+            province_info = province_templates[province]
+            if progress:
+                progress.emit("task_started", {"task": f"research:{province}"})
+            search_results = await search_serper_async(build_search_query(request, province_info, shared))
+            with stage_timer("construction"):
+                researcher = build_researcher(request, province_info, style_info, cost_info, day_info, progress, shared)
+                crew = Crew(
+                    agents=[researcher],
+                    tasks=[build_research_task(request, province_info, researcher, search_results)],
+                    process=Process.sequential,
+                )
+            with stage_timer("research"):
+                output = await run_crew(crew)
+            if progress:
+                progress.emit("task_done", {"task": f"research:{province}"})
+            return f"## {province}\n{output}"
+
+    findings = await asyncio.gather(*(research(province) for province in ALL_PROVINCES))
+    return "\n\n".join(findings)
+
+
+def build_fanout_writer_crew(task_info: ProvinceTemplate, research: str, progress=None):
+    """
+    Writer ตัวเดียวเขียน 5 แพ็กเกจจากผล research ของทุกจังหวัดที่รวมแล้ว
+    """
+    writer = build_writer(task_info, progress)
+    writer_task = Task(
+        agent=writer,
+        description=(
+            task_info.writer_description
+            + "\n\nResearch findings for each province:\n\n"
+            + research
+        ),
+        expected_output=task_info.writer_expected_output,
+        output_pydantic=TripPlan if STRUCTURED_OUTPUT else None,
+    )
+    return Crew(
+        agents=[writer],
+        tasks=[writer_task],
+        process=Process.sequential,
+        task_callback=progress.task_callback if progress else None,
+    )
+
+
+def research_cache_key(request: TaskRequest) -> str:
+    """
+    Key ของ research: เฉพาะฟิลด์ที่ researcher ใช้ (จังหวัด/สไตล์/งบ/จำนวนวัน)
+    คำขอที่ต่างกันแค่ adults/Rq (ฟิลด์ของ writer) ใช้ research เดียวกันได้
+    """
+    return canonical_key({
+        "task_type": request.task_type,
+        "style": request.style,
+        "cost": request.cost,
+        "day": request.day,
+    })
+
+
+def topic_cache_key(request: TaskRequest, topic: ResearchTopic) -> str:
+    """
+    Key ของผล research หนึ่งหัวข้อ: จังหวัด + เฉพาะฟิลด์ที่หัวข้อนั้นใช้
+    """
+    fields = {"topic": topic.name, "task_type": request.task_type}
+    fields.update({name: getattr(request, name) for name in topic.fields})
+    return canonical_key(fields)
+
+
+def build_topic_crew(task_info: ProvinceTemplate, topic: ResearchTopic, options: dict, search_results,
+                     progress=None):
+    """
+    Researcher + Task ของหัวข้อเดียว goal คือ goal ของจังหวัด (รวมข้อความเฉพาะจังหวัด) + จุดเน้นของหัวข้อ
+    และคำอธิบายเฉพาะฟิลด์ใน topic.fields
+    """
+    province = task_info.province
+    researcher = Agent(
+        role=f"Thai Tour Researcher ({topic.name})",
+        goal="".join(
+            [task_info.researcher_goal, f"\nFocus on {topic.focus}.\n"]
+            + [options[name]["description"] for name in topic.fields]
+        ),
+        backstory=RESEARCHER_BACKSTORY,
+        tools=research_tools(),
+        llm=agent_llm("researcher"),
+        step_callback=progress.step_callback(f"researcher:{topic.name}") if progress else None,
+        verbose=True
+    )
+    topic_task = Task(
+        agent=researcher,
+        description=f"Research {topic.focus} in {province}, Thailand, from 2024 to present (2025).",
+        expected_output=f"Information on {topic.focus} in {province}.",
+        tools=research_tools(),
+        context=[search_results],
+    )
+    return Crew(agents=[researcher], tasks=[topic_task], process=Process.sequential)
+
+
+async def run_topic_research(request: TaskRequest, task_info: ProvinceTemplate, style_info, cost_info, day_info,
+                             progress=None) -> str:
+    """
+    research แยกหัวข้อ (RESEARCH_TOPICS): crew ละหัวข้อรันพร้อมกัน → tool call ของแต่ละหัวข้อซ้อนเวลากันได้
+    ผลแต่ละหัวข้อเก็บใน research_cache แยกกัน แล้วรวมตามลำดับหัวข้อเป็น context ของ writer
+    """
+    options = {"style": style_info, "cost": cost_info, "day": day_info}
+    query_fields = {"province": task_info.province, "style": request.style, "cost": request.cost, "day": request.day}
+
+    async def research(topic):
+        key = topic_cache_key(request, topic)
+        findings = await run_blocking(research_cache.get, key)
+        if findings is None:
+            if progress:
+                progress.emit("task_started", {"task": f"research:{topic.name}"})
+            search_results = await search_serper_async(topic.query.format(**query_fields))
+            with stage_timer("construction"):
+                crew = build_topic_crew(task_info, topic, options, search_results, progress)
+            with stage_timer("research"):
+                findings = str(await run_crew(crew))
+            await run_blocking(research_cache.set, key, findings)
+            if progress:
+                progress.emit("task_done", {"task": f"research:{topic.name}"})
+        return f"### {topic.name.capitalize()}\n{findings}"
+
+    findings = await asyncio.gather(*(research(topic) for topic in RESEARCH_TOPICS))
+    return "\n\n".join(findings)
+
+
+async def run_research(request: TaskRequest, task_info, style_info, cost_info, day_info, progress=None,
+                       shared: bool = True) -> str:
+    """
+    รันเฉพาะ research แล้วคืนผลเป็นข้อความ
+    shared=True (ค่าเริ่มต้น): ไม่ผูกกับจำนวนคน/Rq เพื่อใช้ร่วมกันระหว่างคำขอได้
+    """
+    if is_fanout(request):
+        return await run_research_fanout(request, style_info, cost_info, day_info, progress, shared=shared)
+
+    if TOPIC_RESEARCH:
+        # หัวข้อไม่ขึ้นกับจำนวนคน/Rq อยู่แล้ว (writer เป็นคนใช้ฟิลด์เหล่านั้น)
+        research = await run_topic_research(request, task_info, style_info, cost_info, day_info, progress)
+        if progress:
+            progress.task_callback(research)  # ปิด stage research → ประกาศ task_started ของ writer
+        return research
+
+    if progress:
+        progress.emit("status", {"stage": "search"})
+    search_results = await search_serper_async(build_search_query(request, task_info, shared=shared))
+    with stage_timer("construction"):
+        researcher = build_researcher(request, task_info, style_info, cost_info, day_info, progress, shared=shared)
+        crew = Crew(
+            agents=[researcher],
+            tasks=[build_research_task(request, task_info, researcher, search_results)],
+            process=Process.sequential,
+            task_callback=progress.task_callback if progress else None,
+        )
+    if progress:
+        progress.emit("task_started", {"task": "research"})
+    with stage_timer("research"):
+        return str(await run_crew(crew))
+
+
+async def get_research(request: TaskRequest, task_info, style_info, cost_info, day_info, progress=None) -> str:
+    """
+    ผล research แบบ shared จาก research_cache ถ้ามี ไม่งั้นรัน research แล้วเก็บลง cache
+    """
+    key = research_cache_key(request)
+    research = await run_blocking(research_cache.get, key)
+    reused = research is not None
+    if not reused:
+        async def run():
+            findings = await run_research(request, task_info, style_info, cost_info, day_info, progress)
+            await run_blocking(research_cache.set, key, findings)
+            return findings
+
+        reused = research_inflight.is_running(key)
+        research = await research_inflight.do(key, run)
+
+    if reused and progress:
+        progress.emit("status", {"stage": "research_cached"})
+        if not is_fanout(request):
+            progress.task_callback(research)  # ปิด stage research → ประกาศ task_started ของ writer
+    return research
+
+
+async def run_writer(request: TaskRequest, task_info: ProvinceTemplate, research: str, progress=None):
+    """
+    รันเฉพาะ writer จากผล research ที่ได้มาแล้ว (แบบขนานถ้าเปิด PARALLEL_WRITER)
+    """
+    if PARALLEL_WRITER:
+        return await run_parallel_writer(request, task_info, research, progress)
+    with stage_timer("construction"):
+        crew = build_writer_crew(request, task_info, research, progress)
+    with stage_timer("writer"):
+        return await run_crew(crew)
+
+
+def build_writer_crew(request: TaskRequest, task_info: ProvinceTemplate, research: str, progress=None):
+    """
+    Writer ที่เขียนจากผล research ที่ได้มาแล้ว โดยใส่จำนวนคนและ Rq ของคำขอนี้
+    """
+    writer = build_writer(task_info, progress)
+    writer_task = Task(
+        agent=writer,
+        description=(
+            task_info.bind_writer_description(request)
+            + "\nResearch findings:\n\n"
+            + research
+        ),
+        expected_output=task_info.writer_expected_output,
+        output_pydantic=TripPlan if STRUCTURED_OUTPUT else None,
+    )
+    return Crew(
+        agents=[writer],
+        tasks=[writer_task],
+        process=Process.sequential,
+        task_callback=progress.task_callback if progress else None,
+    )
+
+
+def build_package_crew(request: TaskRequest, task_info: ProvinceTemplate, research: str, number: int, hint: str,
+                       progress=None):
+    """
+    Writer ของแพ็กเกจเดียว (writer แบบขนาน) จากผล research เดียวกับแพ็กเกจอื่น
+    """
+    writer = build_writer(task_info, progress)
+    package_task = Task(
+        agent=writer,
+        description=(
+            task_info.bind_package_description(request, number, hint)
+            + "\nResearch findings:\n\n"
+            + research
+        ),
+        expected_output=(
+            f"Package {number} with a day-by-day schedule based on the Researcher's findings, "
+            "approximate costs in THB, a local food or signature dish and recommended accommodation names."
+        ),
+        output_pydantic=Package if STRUCTURED_OUTPUT else None,
+    )
+    return Crew(agents=[writer], tasks=[package_task], process=Process.sequential)
+
+
+# หัวข้อ "Package N" ที่ writer ใส่มาเอง (## Package 2, **Package 1: ชื่อ**, Package 3 - ชื่อ)
+PACKAGE_HEADING = re.compile(r"^\s*(?:#+\s*)?\**\s*Package\b\s*\d*\s*[:\-–]?\s*(?P<title>.*?)\s*\**\s*$", re.IGNORECASE)
+
+
+def with_package_heading(number: int, markdown_text: str) -> str:
+    """
+    ตัดหัวข้อ Package ที่ writer ใส่มาเองทั้งหมดที่อยู่ต้นข้อความ (ข้ามบรรทัดว่าง)
+    แล้วใส่ "## Package {number}" ที่ถูกต้องแทน โดยเก็บชื่อแพ็กเกจจากหัวข้อเดิมไว้
+    """
+    lines = markdown_text.strip().split("\n")
+    title = ""
+    while lines and (not lines[0].strip() or PACKAGE_HEADING.match(lines[0])):
+        match = PACKAGE_HEADING.match(lines.pop(0))
+        if match and not title:
+            title = match.group("title")
+    heading = f"## Package {number}: {title}" if title else f"## Package {number}"
+    return f"{heading}\n\n" + "\n".join(lines).strip()
+
+
+def merge_packages(outputs: list):
+    """
+    รวมผลของแต่ละแพ็กเกจตามลำดับ PACKAGE_HINTS (ไม่ขึ้นกับว่าอันไหนเสร็จก่อน)
+    โหมด structured: ถ้าทุกแพ็กเกจ parse ได้ คืน TripPlan ไม่งั้นคืน Markdown ทั้งหมด
+    (แพ็กเกจที่ parse ได้แปลงเป็น Markdown ด้วย package_markdown ไม่ใช่ข้อความ JSON)
+    """
+    packages = [parse_package(output) if STRUCTURED_OUTPUT else None for output in outputs]
+    if all(packages):
+        return TripPlan(packages=packages)
+
+    parts = []
+    for number, (output, package) in enumerate(zip(outputs, packages), start=1):
+        if package is not None:
+            markdown_text = package_markdown(number, package)
+        else:
+            markdown_text = with_package_heading(number, writer_output(output)[0])
+        parts.append(markdown_text.strip())
+    return "\n\n".join(parts)
+
+
+async def run_parallel_writer(request: TaskRequest, task_info: ProvinceTemplate, research: str, progress=None):
+    """
+    เขียน 5 แพ็กเกจพร้อมกัน (crew ละแพ็กเกจ) แทน writer ตัวเดียวที่เขียนทีละแพ็กเกจ
+    → เวลาของ writer ใกล้เคียงกับการเขียนแพ็กเกจเดียว
+    """
+    with stage_timer("construction"):
+        crews = [
+            build_package_crew(request, task_info, research, number, hint, progress)
+            for number, hint in enumerate(PACKAGE_HINTS, start=1)
+        ]
+
+    async def write(number, crew):
+        output = await run_crew(crew)
+        if progress:
+            progress.emit("task_done", {"task": f"writer:package{number}"})
+        return output
+
+    with stage_timer("writer"):
+        outputs = await asyncio.gather(*(write(number, crew) for number, crew in enumerate(crews, start=1)))
+    result = merge_packages(outputs)
+    if progress:
+        # ปิด stage writer และส่งผลที่รวมแล้วเป็น chunk ตามลำดับแพ็กเกจ
+        progress.task_callback(writer_output(result)[0])
+    return result
+
+
+async def finish_trip(result, cache_key: str, request: TaskRequest) -> dict:
+    """
+    แปลงผลของ writer เป็น HTML ครั้งเดียว → เก็บทั้ง HTML และ Markdown ลง result cache
+    (โหมด structured: เก็บ packages ที่ writer กรอกตาม TripPlan ด้วย และสร้าง Markdown จาก packages)
+    และเก็บ Rq ไว้ใน rq_index สำหรับคำขอที่ Rq ใกล้เคียงกัน
+    """
+    markdown_text, packages = writer_output(result)
+    with stage_timer("markdown"):
+        html_result = markdown.markdown(markdown_text)  # แปลง Markdown เป็น HTML
+
+    response = {
         "message": "Task completed!",
         "result": str(html_result),
+        "result_id": cache_key,
+        "markdown": markdown_text,
+    }
+    if packages is not None:
+        response["packages"] = packages
+    await run_blocking(result_cache.set, cache_key, response)
+    if result_cache.enabled:
+        await run_blocking(rq_index.add, rq_group_key(request), request.Rq, cache_key)
+    return response
+
+
+def partial_response(usage: RequestUsage, error: BudgetExceeded) -> dict:
+    """
+    ผลลัพธ์บางส่วนเมื่อ token budget หมดระหว่างทาง (ไม่เก็บลง result cache)
+    """
+    partial = usage.partial_result()
+    if not partial:
+        raise HTTPException(status_code=429, detail=str(error))
+    return {
+        "message": "Stopped early: token budget exceeded",
+        "result": markdown.markdown(partial),
+        "partial": True,
+        "usage": usage.summary(),
     }
+
+
+async def run_trip(request: TaskRequest, task_info, style_info, cost_info, day_info, cache_key: str, progress=None):
+    """
+    ค้นหาข้อมูลเบื้องต้น → รัน crew → แปลงเป็น HTML → เก็บลง result cache
+    นับ token/tool/Serper ของคำขอนี้ และหยุดก่อนถ้าเกิน token budget
+    """
+    usage = RequestUsage()
+    current_usage.set(usage)
+    try:
+        result = await run_trip_crews(request, task_info, style_info, cost_info, day_info, progress)
+    except BudgetExceeded as e:
+        return partial_response(usage, e)
+    response = await finish_trip(result, cache_key, request)
+    return dict(response, usage=usage.summary())
+
+
+async def run_trip_crews(request: TaskRequest, task_info, style_info, cost_info, day_info, progress=None):
+    """
+    รัน research + writer ของคำขอ แล้วคืนผลของ writer
+    """
+    if research_cache.enabled:
+        # research ใช้ร่วมกันระหว่างคำขอที่ต่างกันแค่ adults/Rq → ถ้ามีใน cache รันแค่ writer
+        research = await get_research(request, task_info, style_info, cost_info, day_info, progress)
+        if progress and is_fanout(request):
+            progress.emit("task_started", {"task": "writer"})
+        return await run_writer(request, task_info, research, progress)
+
+    if PARALLEL_WRITER or (TOPIC_RESEARCH and not is_fanout(request)):
+        # research เป็น crew ของตัวเอง (แยกหัวข้อ หรือให้ writer แยกแพ็กเกจ) แล้วจึงรัน writer
+        research = await run_research(request, task_info, style_info, cost_info, day_info, progress, shared=False)
+        if progress and is_fanout(request):
+            progress.emit("task_started", {"task": "writer"})
+        return await run_writer(request, task_info, research, progress)
+
+    if is_fanout(request):
+        research = await run_research_fanout(request, style_info, cost_info, day_info, progress)
+        with stage_timer("construction"):
+            crew = build_fanout_writer_crew(task_info, research, progress)
+        if progress:
+            progress.emit("task_started", {"task": "writer"})
+        with stage_timer("writer"):
+            result = await run_crew(crew)
+    else:
+        # ค้นหาข้อมูลเบื้องต้นตรงนี้ เพื่อนำไปใส่ใน context
+        if progress:
+            progress.emit("status", {"stage": "search"})
+        search_results = await search_serper_async(build_search_query(request, task_info))
+
+        # research/writer อยู่ใน crew เดียวกัน → แยกเวลาด้วย task_callback
+        timer = StageTimer(["research", "writer"], then=progress.task_callback if progress else None)
+        with stage_timer("construction"):
+            crew = build_crew(request, task_info, style_info, cost_info, day_info, search_results,
+                              progress=progress, timer=timer)
+        if progress:
+            progress.emit("task_started", {"task": "research"})
+
+        # 9) สั่งทำงาน
+        try:
+            result = await run_crew(crew)
+        except Exception:
+            timer.fail()
+            raise
+
+    return result
+
+
+async def create_trip(request: TaskRequest, wait: bool = False) -> dict:
+    """
+    รับ Task จาก Frontend → สร้าง CrewAI workflow → คืนผลลัพธ์ (มีทั้ง HTML และ Markdown)
+    wait=True (job): รอคิวของ admission จนได้ slot แทนการได้ 429
+    """
+    task_info, style_info, cost_info, day_info = validate_request(request)
+
+    # ถ้าเคยมีคำขอเดียวกันแล้ว ตอบจาก cache ได้เลย ไม่ต้องเรียก LLM/Serper
+    cache_key = request_cache_key(request)
+    await record_request(request)
+    cached = await cached_result(request, cache_key)
+    if cached is not None:
+        return dict(cached, cached=True)
+
+    # คำขอเดียวกันที่กำลังรันอยู่ → รอผลจาก crew ตัวเดิม ไม่สร้าง crew ใหม่
+    return await inflight.do(
+        cache_key,
+        lambda: admission.run(lambda: run_trip(request, task_info, style_info, cost_info, day_info, cache_key), wait=wait),
+    )
+
+
+@app.post("/set_task")
+async def set_task(request: TaskRequest, http_request: Request, format: str = "json"):
+    """
+    เหมือน create_trip แต่ส่งเฉพาะรูปแบบที่ขอ (?format=json|html|md) พร้อม ETag และบีบอัดตาม Accept-Encoding
+    """
+    return deliver(http_request, await create_trip(request), format, conditional=False)
+
+
+@app.get("/results/{result_id}")
+async def get_result(result_id: str, http_request: Request, format: str = "json"):
+    """
+    ผลลัพธ์ที่เก็บไว้ตาม result_id; ส่ง If-None-Match มาถ้ามีอยู่แล้ว จะได้ 304 แทนเนื้อหาเต็ม
+    """
+    record = await run_blocking(result_cache.get, result_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Result not found or expired")
+    return deliver(http_request, record, format)
+
+
+async def until_admitted(func):
+    """
+    งานเบื้องหลังรอคิวโดยไม่ถูกปฏิเสธ (wait=True) แต่ถ้าไปรอผลร่วมกับคำขอปกติที่ได้ 429
+    ก็จะได้ 429 ด้วย → รอตาม Retry-After แล้วลองใหม่
+    """
+    while True:
+        try:
+            return await func()
+        except HTTPException as e:
+            if e.status_code != 429:
+                raise
+            await asyncio.sleep(int(e.headers["Retry-After"]))
+
+
+async def trip_job(request: TaskRequest) -> dict:
+    return public_result(await until_admitted(lambda: create_trip(request, wait=True)))
+
+
+@app.post("/set_task/stream")
+async def set_task_stream(request: TaskRequest):
+    """
+    เหมือน /set_task แต่ส่งความคืบหน้าแบบ Server-Sent Events ระหว่างที่ crew ทำงาน
+    (tool call ของ researcher, การเปลี่ยน task, ผลลัพธ์ของ writer ทีละส่วน)
+    """
+    task_info, style_info, cost_info, day_info = validate_request(request)
+    progress = ProgressStream(stages=["writer"] if is_fanout(request) else ["research", "writer"])
+
+    async def run():
+        try:
+            cache_key = request_cache_key(request)
+            await record_request(request)
+            cached = await cached_result(request, cache_key)
+            if cached is not None:
+                progress.emit("result", public_result(dict(cached, cached=True)))
+                return
+
+            # ถ้ามี crew ของคำขอเดียวกันรันอยู่แล้ว จะได้แค่ผลลัพธ์สุดท้าย (ไม่มี progress ระหว่างทาง)
+            if inflight.is_running(cache_key):
+                progress.emit("status", {"stage": "coalesced"})
+            response = await inflight.do(
+                cache_key,
+                lambda: admission.run(
+                    lambda: run_trip(request, task_info, style_info, cost_info, day_info, cache_key, progress=progress),
+                    on_position=lambda position, retry_after: progress.emit(
+                        "queued", {"position": position, "retry_after": retry_after}
+                    ),
+                ),
+            )
+            progress.emit("result", public_result(response))
+        except HTTPException as e:
+            error = {"detail": e.detail}
+            if e.status_code == 429 and e.headers:
+                error["retry_after"] = int(e.headers["Retry-After"])
+            progress.emit("error", error)
+        except Exception as e:
+            progress.emit("error", {"detail": str(e)})
+        finally:
+            progress.close()
+
+    progress.runner = asyncio.create_task(run())
+    return StreamingResponse(
+        progress.events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ---------- Pre-warm: สร้างผลของคำขอยอดนิยมล่วงหน้า ----------
+async def warm_request(fields: dict):
+    """
+    รัน crew ของคำขอที่บันทึกไว้ใน request_stats แล้วเก็บผลลง result cache
+    """
+    request = TaskRequest(**fields)
+    task_info, style_info, cost_info, day_info = validate_request(request)
+    cache_key = request_cache_key(request)
+    await inflight.do(
+        cache_key,
+        lambda: admission.run(lambda: run_trip(request, task_info, style_info, cost_info, day_info, cache_key), wait=True),
+    )
+
+
+def build_prewarmer(top_n: int = PREWARM_TOP_N) -> Prewarmer:
+    return Prewarmer(request_stats, result_cache, warm_request, top_n=top_n)
+
+
+# ---------- Batch: POST /set_task/batch ----------
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "50"))
+
+
+async def run_batch_item(request: TaskRequest, shared_research: dict) -> dict:
+    """
+    หนึ่งรายการของ batch: ตอบจาก cache ถ้ามี, ไม่งั้นใช้ research ร่วมกับรายการอื่นใน batch
+    ที่มี research_cache_key เดียวกัน แล้วรันเฉพาะ writer ของรายการนี้
+    research และ writer แต่ละขั้นรอ slot ของ admission (wait=True) ร่วมกับคำขออื่นทั้งหมด
+    """
+    task_info, style_info, cost_info, day_info = validate_request(request)
+    cache_key = request_cache_key(request)
+    await record_request(request)
+    cached = await cached_result(request, cache_key)
+    if cached is not None:
+        return dict(cached, cached=True)
+
+    async def research():
+        return await admission.run(lambda: get_research(request, task_info, style_info, cost_info, day_info), wait=True)
+
+    async def run():
+        usage = RequestUsage()
+        current_usage.set(usage)
+        try:
+            return await run_shared(usage)
+        except BudgetExceeded as e:
+            return partial_response(usage, e)
+
+    async def run_shared(usage):
+        key = research_cache_key(request)
+        if key not in shared_research:
+            shared_research[key] = asyncio.ensure_future(research())
+        findings = await asyncio.shield(shared_research[key])
+        # writer แบบขนาน: 5 crew ของแพ็กเกจนับเป็นหนึ่ง slot ของ admission
+        result = await admission.run(lambda: run_writer(request, task_info, findings), wait=True)
+        response = await finish_trip(result, cache_key, request)
+        return dict(response, usage=usage.summary())
+
+    return await until_admitted(lambda: inflight.do(cache_key, run))
+
+
+@app.post("/set_task/batch")
+async def set_task_batch(batch: BatchRequest):
+    """
+    รับหลายคำขอในครั้งเดียว (เช่น ทุกจังหวัด × ทุกสไตล์)
+    - รายการที่ซ้ำกันรันครั้งเดียว แล้วตอบทุก index ที่ซ้ำ
+    - research ใช้ร่วมกันระหว่างรายการที่ต่างกันแค่ adults/Rq
+    - ตอบเป็น NDJSON หนึ่งบรรทัดต่อรายการทันทีที่เสร็จ หรือ job id ของแต่ละรายการถ้า as_jobs=true
+    """
+    if not batch.items:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if len(batch.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch is limited to {BATCH_MAX_ITEMS} items")
+
+    unique = {}
+    for index, request in enumerate(batch.items):
+        unique.setdefault(request_cache_key(request), (request, []))[1].append(index)
+    shared_research = {}
+
+    if batch.as_jobs:
+        async def batch_job(request):
+            return public_result(await run_batch_item(request, shared_research))
+
+        items = []
+        for request, indices in unique.values():
+            try:
+                validate_request(request)
+            except HTTPException as e:
+                items.append({"indices": indices, "status": "failed", "error": e.detail})
+                continue
+            job = job_store.submit(batch_job, request)
+            items.append({"indices": indices, "job_id": job["job_id"], "status": job["status"]})
+        return {"items": items}
+
+    async def run_one(request, indices):
+        try:
+            result = await run_batch_item(request, shared_research)
+            return {"indices": indices, "status": "done", "result": public_result(result)}
+        except HTTPException as e:
+            return {"indices": indices, "status": "failed", "error": e.detail}
+        except Exception as e:
+            return {"indices": indices, "status": "failed", "error": str(e)}
+
+    async def lines():
+        pending = [asyncio.ensure_future(run_one(request, indices)) for request, indices in unique.values()]
+        try:
+            for done in asyncio.as_completed(pending):
+                yield json.dumps(await done, ensure_ascii=False) + "\n"
+        finally:
+            # client ปิดการเชื่อมต่อ → ยกเลิกรายการที่ยังไม่เสร็จ (crew ที่เริ่มแล้วยังเขียนผลลง cache)
+            for task in pending:
+                task.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    สถิติ hit/miss ของ cache
+    """
+    return {
+        "results": result_cache.stats(),
+        "search": search_cache.stats(),
+        "research": research_cache.stats(),
+        "llm": llm_cache.stats(),
+        "rq_match": rq_index.stats(),
+        "inflight": inflight.stats(),
+    }
+
+
+# ---------- Job mode: POST /jobs → job id, GET /jobs/{job_id} → status/result ----------
+job_store = register_job_routes(app, TaskRequest, trip_job, validate=validate_request)
+
+
+# ---------- Metrics: GET /metrics (Prometheus) ----------
+CACHE_HIT_RATIO = Gauge("trip_cache_hit_ratio", "Hit ratio of each cache since the server started.", ["cache"])
+CACHE_ENTRIES = Gauge("trip_cache_entries", "Entries currently stored in each cache.", ["cache"])
+JOBS = Gauge("trip_jobs", "Jobs in the job store by status (queued = job queue depth).", ["status"])
+INFLIGHT_REQUESTS = Gauge("trip_inflight_requests", "Distinct trip requests currently being generated.")
+ADMISSION = Gauge("trip_admission", "Admission control: running, queued and rejected (total) trips.", ["state"])
+
+
+def update_metrics():
+    """
+    อ่านค่าจาก cache, job store และ inflight ก่อนส่ง /metrics
+    """
+    caches = (("results", result_cache), ("research", research_cache), ("search", search_cache), ("llm", llm_cache))
+    for name, cache in caches:
+        stats = cache.stats()
+        CACHE_HIT_RATIO.set(stats["hit_ratio"], cache=name)
+        CACHE_ENTRIES.set(stats["entries"], cache=name)
+    for status, count in job_store.stats().items():
+        JOBS.set(count, status=status)
+    INFLIGHT_REQUESTS.set(inflight.stats()["running"])
+    for state, count in admission.stats().items():
+        ADMISSION.set(count, state=state)
+
+
+register_metrics_route(app, before_scrape=update_metrics)
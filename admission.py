@@ -0,0 +1,119 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+
+from fastapi import HTTPException
+
+# ---------- Admission settings ----------
+ADMISSION_MAX_RUNNING = int(os.getenv("ADMISSION_MAX_RUNNING", "4"))     # trips generated at the same time
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "20"))      # trips allowed to wait for a slot
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "300"))  # max seconds in the queue
+# Retry-After guess (seconds per run) until a few runs have finished
+ADMISSION_DEFAULT_DURATION = float(os.getenv("ADMISSION_DEFAULT_DURATION", "60"))
+
+
+class _Waiter:
+    def __init__(self, future, on_position, wait):
+        self.future = future
+        self.on_position = on_position
+        self.wait = wait
+
+
+class AdmissionController:
+    """
+    Limit how many trips run at once and queue a bounded number of the rest.
+
+    A request that finds the queue full, or waits longer than `queue_timeout`,
+    is rejected with 429 and a Retry-After estimated from recent run durations.
+    Waiters are served in arrival order; `on_position(position, retry_after)`
+    is called whenever a waiter's place in the queue changes. Background work
+    (jobs, batch, pre-warm) passes `wait=True`: it takes a place in the same
+    queue but is never rejected, and does not count against `queue_size`.
+    """
+
+    def __init__(self, max_running: int = ADMISSION_MAX_RUNNING, queue_size: int = ADMISSION_QUEUE_SIZE,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT, history: int = 50):
+        self.max_running = max_running
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.rejected = 0
+        self._running = 0
+        self._queue = deque()
+        self._durations = deque(maxlen=history)
+
+    async def run(self, func, on_position=None, wait: bool = False):
+        """
+        Wait for a slot, then `await func()`.
+        """
+        await self._acquire(on_position, wait)
+        started = time.monotonic()
+        try:
+            return await func()
+        finally:
+            self._durations.append(time.monotonic() - started)
+            self._release()
+
+    def retry_after(self, position: int) -> int:
+        """
+        Seconds until `position` (1 = next in line) can expect to start.
+        """
+        if self._durations:
+            duration = sorted(self._durations)[len(self._durations) // 2]
+        else:
+            duration = ADMISSION_DEFAULT_DURATION
+        return max(1, math.ceil(duration * math.ceil(position / max(1, self.max_running))))
+
+    def stats(self) -> dict:
+        return {"running": self._running, "queued": len(self._queue), "rejected": self.rejected}
+
+    async def _acquire(self, on_position, wait: bool):
+        if self._running < self.max_running and not self._queue:
+            self._running += 1
+            return
+        if not wait and sum(1 for waiter in self._queue if not waiter.wait) >= self.queue_size:
+            self._reject("The server is busy, please try again later.", len(self._queue) + 1)
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), on_position, wait)
+        self._queue.append(waiter)
+        self._notify(waiter, len(self._queue))
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), None if wait else self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.future.done():
+                return  # the slot arrived together with the deadline
+            self._leave(waiter)
+            self._reject("Waited too long in the queue, please try again later.", len(self._queue) + 1)
+        except asyncio.CancelledError:
+            # client went away: give back a slot that was already handed over
+            if waiter.future.done():
+                self._release()
+            else:
+                self._leave(waiter)
+            raise
+
+    def _release(self):
+        self._running -= 1
+        while self._queue and self._running < self.max_running:
+            waiter = self._queue.popleft()
+            self._running += 1
+            waiter.future.set_result(True)
+        self._notify_all()
+
+    def _leave(self, waiter: _Waiter):
+        self._queue.remove(waiter)
+        self._notify_all()
+
+    def _notify(self, waiter: _Waiter, position: int):
+        if waiter.on_position is not None:
+            waiter.on_position(position, self.retry_after(position))
+
+    def _notify_all(self):
+        for position, waiter in enumerate(self._queue, start=1):
+            self._notify(waiter, position)
+
+    def _reject(self, message: str, position: int):
+        self.rejected += 1
+        retry_after = self.retry_after(position)
+        raise HTTPException(status_code=429, detail=message, headers={"Retry-After": str(retry_after)})
@@ -3,6 +3,9 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from crewai import Agent, Crew, Task, Process 
 
+from executors import run_crew
+from jobs import register_job_routes
+
 app = FastAPI()
 
 # ✅ อนุญาตให้ Frontend เรียก API ได้
@@ -97,6 +100,10 @@ async def set_task(request: TaskRequest):
     )
 
     # เริ่มทำงานและรับผลลัพธ์
-    result = crew.kickoff()
+    result = await run_crew(crew)
 
     return {"message": "Task completed!", "result": str(result)}
+
+
+# ---------- Job mode: POST /jobs → job id, GET /jobs/{job_id} → status/result ----------
+job_store = register_job_routes(app, TaskRequest, set_task)
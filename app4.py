@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
@@ -5,18 +7,28 @@ from crewai import Agent, Crew, Task, Process
 from crewai_tools import SerperDevTool
 import markdown
 import os
-import requests
-import json
+
+from executors import run_crew
+from serper import SERPER_BASE_URL, SerperError, serper_client
+from trip_schema import STRUCTURED_OUTPUT, TripPlan, writer_output
+from jobs import register_job_routes
 
 SERPER_API_KEY = os.getenv("SERPER_API_KEY")
 if not SERPER_API_KEY:
 
     print("Warning: SERPER_API_KEY is not set. Please set it in your environment.")
     
-# ตั้งค่า SerperDevTool (Search Tool)
-search_tools = SerperDevTool(api_key=SERPER_API_KEY)
+# ตั้งค่า SerperDevTool (Search Tool) — SERPER_BASE_URL ใช้ Serper จำลองในเครื่องแทนของจริงได้ (benchmarks/fake_serper.py)
+search_tools = SerperDevTool(api_key=SERPER_API_KEY, base_url=SERPER_BASE_URL)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # ปิด connection pool ของ Serper ตอนปิด server
+    await serper_client.aclose()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 # Allow Frontend to call this API
 app.add_middleware(
@@ -235,36 +247,29 @@ day_mapping = {
     },
 }
 
-def search_serper(query: str):
+async def search_serper(query: str):
     """
     เรียกใช้งาน Serper (Google Search) และคืนค่าที่เหมาะสม
+    ผ่าน serper_client ที่ใช้ร่วมกัน (connection pool, timeout, retry) บน event loop
     """
     if not SERPER_API_KEY:
         raise HTTPException(status_code=400, detail="Serper API key not configured.")
 
-    url = "https://google.serper.dev/search"
-    payload = json.dumps({"q": query})
-    headers = {
-        'X-API-KEY': SERPER_API_KEY,
-        'Content-Type': 'application/json'
-    }
+    try:
+        data = await serper_client.asearch({"q": query})
+    except SerperError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
 
-    response = requests.post(url, headers=headers, data=payload)
-    if response.status_code == 200:
-        data = response.json()
-        
-        # ดึงข้อมูลจากผลลัพธ์ organic เท่านั้น
-        search_results = data.get("organic", [])
+    # ดึงข้อมูลจากผลลัพธ์ organic เท่านั้น
+    search_results = data.get("organic", [])
 
-        # แปลงเป็นข้อความที่สามารถใช้เป็น context
-        formatted_results = "\n".join([f"- {result['title']}: {result['link']}" for result in search_results])
+    # แปลงเป็นข้อความที่สามารถใช้เป็น context
+    formatted_results = "\n".join([f"- {result['title']}: {result['link']}" for result in search_results])
 
-        return {
-            "description": f"ผลการค้นหาสำหรับ: {query}",
-            "expected_output": formatted_results
-        }
-    else:
-        raise HTTPException(status_code=response.status_code, detail="Search API request failed.")
+    return {
+        "description": f"ผลการค้นหาสำหรับ: {query}",
+        "expected_output": formatted_results
+    }
 
 
 @app.post("/set_task")
@@ -334,7 +339,7 @@ async def set_task(request: TaskRequest):
         f"{task_info['pv']} with a budget of {request.cost} for {request.day} days, "
         f"considering the number of travelers ({request.adults} adults)."
     )
-    search_results = search_serper(query)
+    search_results = await search_serper(query)
 
     # 6) สร้าง Task สำหรับ Researcher
     research_task = Task(
@@ -362,6 +367,7 @@ async def set_task(request: TaskRequest):
         agent=writer,
         description=task_info["description"],
         expected_output=task_info["expected_output"],
+        output_pydantic=TripPlan if STRUCTURED_OUTPUT else None,  # STRUCTURED_OUTPUT=1 → JSON ตาม TripPlan
         context=[research_task],  # ดึงผลจาก researcher
         # output_file='./output/writer/writer_output.md'
     )
@@ -374,11 +380,19 @@ async def set_task(request: TaskRequest):
     )
 
     # 9) สั่งทำงาน
-    result = crew.kickoff()
-    
-    html_result = markdown.markdown(str(result))
+    result = await run_crew(crew)
 
-    return {
+    markdown_text, packages = writer_output(result)
+    html_result = markdown.markdown(markdown_text)
+
+    response = {
         "message": "Task completed!",
         "result": str(html_result),
     }
+    if packages is not None:
+        response["packages"] = packages
+    return response
+
+
+# ---------- Job mode: POST /jobs → job id, GET /jobs/{job_id} → status/result ----------
+job_store = register_job_routes(app, TaskRequest, set_task)
@@ -6,8 +6,14 @@ from crewai_tools import SerperDevTool
 import markdown
 import os
 
+from executors import run_crew
+from jobs import register_job_routes
+
 # ตั้งค่า API Key ของ SerperDevTool (Search Tool)
-search_tools = SerperDevTool(api_key=os.getenv("SERPER_API_KEY"))
+search_tools = SerperDevTool(
+    api_key=os.getenv("SERPER_API_KEY"),
+    base_url=os.getenv("SERPER_BASE_URL", "https://google.serper.dev"),  # Serper จำลองในเครื่องสำหรับทดสอบโหลด
+)
 
 app = FastAPI()
 
@@ -320,10 +326,14 @@ async def set_task(request: TaskRequest):
     )
 
     # เริ่มต้นทำงาน
-    result = crew.kickoff()
+    result = await run_crew(crew)
     html_result = markdown.markdown(str(result))
 
     return {
         "message": "Task completed!",
         "result": str(html_result)
     }
+
+
+# ---------- Job mode: POST /jobs → job id, GET /jobs/{job_id} → status/result ----------
+job_store = register_job_routes(app, TaskRequest, set_task)
@@ -0,0 +1,65 @@
+"""
+Micro-benchmark of the per-request setup cost in add_all.set_task: option
+validation plus building the Agents, Tasks and Crew (no LLM or Serper calls).
+
+Run from the repository root:
+
+    python benchmarks/bench_setup.py [--rounds 200]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("SERPER_API_KEY", "benchmark")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+# add_all mounts ./static, give it an empty one
+os.chdir(tempfile.mkdtemp())
+os.makedirs("static", exist_ok=True)
+
+import add_all  # noqa: E402
+
+SEARCH_RESULTS = {"description": "benchmark", "expected_output": "- benchmark: http://localhost"}
+
+
+def setup_once(request):
+    infos = add_all.validate_request(request)
+    return add_all.build_crew(request, *infos, SEARCH_RESULTS)
+
+
+def measure(func, rounds: int) -> list:
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    request = add_all.TaskRequest(
+        task_type="Songkhla", style="Natural", cost="Mid", day="3", adults="2", Rq="vegetarian food",
+    )
+    # warm up imports, i18n prompt files, pydantic schemas
+    measure(lambda: setup_once(request), 10)
+
+    samples = sorted(measure(lambda: setup_once(request), args.rounds))
+    print(f"per-request setup over {args.rounds} rounds (ms): "
+          f"mean={statistics.mean(samples):.3f} "
+          f"p50={samples[len(samples) // 2]:.3f} "
+          f"p95={samples[int(len(samples) * 0.95) - 1]:.3f}")
+
+
+if __name__ == "__main__":
+    main()
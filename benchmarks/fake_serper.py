@@ -0,0 +1,225 @@
+"""
+Local stand-in for the Serper API (https://google.serper.dev) for load and soak
+tests that must not use the Serper quota.
+
+It answers `POST /<search_type>` (search, news, places, ...) with the same
+request and response shape as Serper: the JSON payload (`q`, `num`, `gl`, `hl`,
+`location`, `page`) and the X-API-KEY header in, `searchParameters` + `organic`
+out. Results are generated from the query (the same query always gets the same
+results) or taken from a canned file, and every reply can be delayed, fail or
+hang on purpose:
+
+    python benchmarks/fake_serper.py --port 8792 --latency lognormal:0.3:0.3 \
+        --error-rate 0.02 --error-status 429,500,503 --hang-rate 0.005
+
+Point the apps at it next to the API key (any key is accepted):
+
+    SERPER_API_KEY=local SERPER_BASE_URL=http://127.0.0.1:8792 uvicorn add_all:app
+
+--canned takes either a cassette recorded by benchmarks/replay_set_task.py
+(real Serper responses, matched by endpoint and payload) or a JSON object of
+{query: response}; queries not in it fall back to generated results.
+`GET /stats` returns request, error and hang counts.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# cassette keys are computed by trip.cassette (imported only for cassette files)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Groq", "trip", "src"))
+
+from fake_services import parse_latency, serper_response  # noqa: E402
+
+PLACES = ["Beach", "Viewpoint", "Night Market", "Temple", "Waterfall", "National Park", "Old Town", "Pier", "Cafe"]
+SNIPPETS = [
+    "Opening hours 08:00-17:00, entrance fee {fee} THB.",
+    "Best visited early in the morning; about {fee} THB per person.",
+    "Local favourite with seafood stalls, dishes from {fee} THB.",
+    "Long-tail boat trips leave every hour, {fee} THB return.",
+]
+
+
+def generated_response(payload: dict, search_type: str = "search") -> dict:
+    """
+    Serper-shaped response for `payload`, deterministic per query, with `num` organic results.
+    """
+    response = serper_response(payload)
+    query = payload.get("q", "")
+    rng = random.Random(zlib.crc32(f"{search_type}:{query}".encode("utf-8")))
+    offset = (int(payload.get("page") or 1) - 1) * len(response["organic"])
+    for result in response["organic"]:
+        place = rng.choice(PLACES)
+        result["position"] += offset
+        result["title"] = f"{place} - {query[:40]}"
+        result["link"] = f"https://example.com/{search_type}/{zlib.crc32(query.encode('utf-8'))}/{result['position']}"
+        result["snippet"] = rng.choice(SNIPPETS).format(fee=rng.randrange(0, 500, 20))
+    response["searchParameters"].update({
+        "type": search_type,
+        "num": len(response["organic"]),
+        "page": int(payload.get("page") or 1),
+        **{name: payload[name] for name in ("gl", "hl", "location") if payload.get(name)},
+    })
+    response["credits"] = 1
+    return response
+
+
+def load_canned(path: str) -> dict:
+    """
+    {key: response} of a cassette (key = endpoint + payload) or a {query: response} file.
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if "interactions" not in data:
+        return {("query", query.strip().lower()): response for query, response in data.items()}
+    canned = {}
+    for key, answers in data["interactions"].get("serper", {}).items():
+        ok = [answer for answer in answers if answer["status"] == 200]
+        if ok:
+            canned[("cassette", key)] = json.loads(ok[0]["body"])
+    return canned
+
+
+class FakeSerper:
+    """
+    Threaded HTTP server that behaves like Serper, with injected latency,
+    errors (`error_rate`, a random status of `error_statuses`) and hangs
+    (`hang_rate`, no answer for `hang_seconds`, longer than the client's read timeout).
+    """
+
+    def __init__(self, port: int = 0, latency: str = "0", error_rate: float = 0.0,
+                 error_statuses=(500,), hang_rate: float = 0.0, hang_seconds: float = 30.0,
+                 canned: dict = None, host: str = "127.0.0.1"):
+        self.delay = parse_latency(latency)
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.canned = canned or {}
+        self._cassette = any(kind == "cassette" for kind, _ in self.canned)
+        self.counts = {"requests": 0, "ok": 0, "canned": 0, "errors": 0, "hangs": 0, "unauthorized": 0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, *kinds: str):
+        with self._lock:
+            for kind in kinds:
+                self.counts[kind] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+    def answer(self, search_type: str, payload: dict, body: bytes) -> dict:
+        keys = [("query", str(payload.get("q", "")).strip().lower())]
+        if self._cassette:
+            from trip.cassette import serper_key
+
+            keys.insert(0, ("cassette", serper_key("POST", f"/{search_type}", body)))
+        for key in keys:
+            if key in self.canned:
+                self._count("canned")
+                return self.canned[key]
+        return generated_response(payload, search_type)
+
+    def _handler(self):
+        serper = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, body: dict):
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _error(self, status: int, message: str):
+                self._reply(status, {"message": message, "statusCode": status})
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/stats":
+                    self._reply(200, serper.stats())
+                else:
+                    self._error(404, "Not found.")
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length)
+                serper._count("requests")
+                if not self.headers.get("X-API-KEY"):
+                    serper._count("unauthorized")
+                    return self._error(403, "Unauthorized.")
+                try:
+                    payload = json.loads(body or b"{}")
+                except ValueError:
+                    return self._error(400, "Invalid JSON body.")
+
+                time.sleep(serper.delay())
+                roll = random.random()
+                if roll < serper.hang_rate:
+                    serper._count("hangs")
+                    time.sleep(serper.hang_seconds)
+                    self.close_connection = True
+                    return
+                if roll < serper.hang_rate + serper.error_rate:
+                    serper._count("errors")
+                    return self._error(random.choice(serper.error_statuses), "Injected error.")
+                search_type = self.path.strip("/").split("?")[0] or "search"
+                response = serper.answer(search_type, payload, body)
+                serper._count("ok")
+                self._reply(200, response)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the Serper API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8792)
+    parser.add_argument("--latency", default="lognormal:0.3:0.3", help="see benchmarks/fake_services.py")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with an error")
+    parser.add_argument("--error-status", default="500", help="comma-separated statuses of the injected errors")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="share of requests never answered")
+    parser.add_argument("--hang-seconds", type=float, default=30.0)
+    parser.add_argument("--canned", help="cassette or {query: response} JSON file")
+    args = parser.parse_args()
+
+    canned = load_canned(args.canned) if args.canned else None
+    serper = FakeSerper(
+        args.port, args.latency, args.error_rate, [int(status) for status in args.error_status.split(",")],
+        args.hang_rate, args.hang_seconds, canned, args.host,
+    )
+    print(f"Fake Serper: SERPER_BASE_URL={serper.url} ({len(canned or {})} canned responses)")
+    serper._server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Fake OpenAI-compatible LLM and fake Serper API in one local HTTP server, used by
+run_bench.py so the apps can be load-tested offline and without API costs.
+
+Each reply is delayed by a sample from a configurable latency distribution:
+
+    fixed:0.5          always 0.5 s (a bare number means the same)
+    uniform:0.2:0.8    between 0.2 and 0.8 s
+    normal:1.0:0.3     mean 1.0 s, standard deviation 0.3 s (clipped at 0)
+    lognormal:1.0:0.5  median 1.0 s, sigma 0.5 (long right tail, like real LLM calls)
+    exp:0.5            exponential with mean 0.5 s
+
+Run standalone with:
+
+    python benchmarks/fake_services.py --port 8790 --llm-latency lognormal:1:0.4
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FINAL_ANSWER = (
+    "Thought: I now know the final answer\n"
+    "Final Answer: ## Package 1: Benchmark trip\n"
+    "- Day 1: Morning - Viewpoint (free); Afternoon - Local market (200 THB); "
+    "Evening - Seafood dinner (400 THB)\n"
+    "- Accommodation: Benchmark Hotel (1,200 THB/night)\n"
+    "- Signature dish: Khao Yam\n"
+)
+
+
+def parse_latency(spec: str):
+    """
+    Turn a latency spec (see the module docstring) into a function returning seconds.
+    """
+    kind, _, rest = str(spec).partition(":")
+    if not rest:
+        kind, rest = "fixed", kind
+    args = [float(value) for value in rest.split(":")]
+    if kind == "fixed":
+        return lambda: args[0]
+    if kind == "uniform":
+        return lambda: random.uniform(args[0], args[1])
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(args[0], args[1]))
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(math.log(args[0]), args[1])
+    if kind == "exp":
+        return lambda: random.expovariate(1 / args[0])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class FakeServices:
+    """
+    Threaded HTTP server answering `POST */chat/completions` like OpenAI and
+    any other `POST /<search_type>` like Serper.
+    """
+
+    def __init__(self, port: int = 0, llm_latency: str = "0", serper_latency: str = "0"):
+        self.llm_delay = parse_latency(llm_latency)
+        self.serper_delay = parse_latency(serper_latency)
+        self.counts = {"llm": 0, "serper": 0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, kind: str):
+        with self._lock:
+            self.counts[kind] += 1
+
+    def _handler(self):
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, body: dict):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if self.path.rstrip("/").endswith("chat/completions"):
+                    services._count("llm")
+                    time.sleep(services.llm_delay())
+                    self._reply(llm_response(payload))
+                else:
+                    services._count("serper")
+                    time.sleep(services.serper_delay())
+                    self._reply(serper_response(payload))
+
+        return Handler
+
+
+def llm_response(payload: dict) -> dict:
+    prompt_tokens = sum(len(str(m.get("content", ""))) for m in payload.get("messages", [])) // 4
+    completion_tokens = len(FINAL_ANSWER) // 4
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": payload.get("model", "fake"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": FINAL_ANSWER},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def serper_response(payload: dict) -> dict:
+    query = payload.get("q", "")
+    return {
+        "searchParameters": {"q": query, "type": "search", "engine": "google"},
+        "organic": [
+            {
+                "title": f"Result {position} for {query[:40]}",
+                "link": f"https://example.com/{position}",
+                "snippet": "Opening hours 08:00-17:00, entrance fee 50 THB.",
+                "position": position,
+            }
+            for position in range(1, int(payload.get("num") or 10) + 1)
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the fake LLM + Serper server.")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--llm-latency", default="lognormal:1.0:0.4")
+    parser.add_argument("--serper-latency", default="lognormal:0.3:0.3")
+    args = parser.parse_args()
+
+    services = FakeServices(args.port, args.llm_latency, args.serper_latency)
+    print(f"Fake LLM: {services.url}/v1  Fake Serper: {services.url}")
+    services._server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
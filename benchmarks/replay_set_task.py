@@ -0,0 +1,115 @@
+"""
+Record one `POST /set_task` of add_all into a cassette, then replay it offline.
+
+Recording runs the whole pipeline against the real (or fake) LLM and Serper and
+stores every LLM answer and Serper response (Groq/trip/src/trip/cassette.py).
+Replaying answers those calls from the cassette with no network access and
+checks that the result is the same, so a pipeline change can be regression-
+and performance-tested in seconds:
+
+    python benchmarks/replay_set_task.py record cassettes/trang.json \
+        --body '{"task_type": "Trang", "style": "Natural", "cost": "Mid", "day": "3", "adults": "2", "Rq": ""}'
+    python benchmarks/replay_set_task.py replay cassettes/trang.json --iterations 5
+
+All caches are disabled (in a throw-away CACHE_PATH) so every run executes the
+crews. Pipeline settings such as PARALLEL_WRITER or TOPIC_RESEARCH must be the
+same when replaying as when recording, since they change the LLM calls.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "Groq", "trip", "src"))
+# before crewai is imported: nothing may leave the machine during a replay
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ.setdefault("CREWAI_TRACING_ENABLED", "false")
+
+from trip.cassette import Cassette  # noqa: E402
+
+DEFAULT_BODY = {"task_type": "Satun", "style": "Natural", "cost": "Low", "day": "2", "adults": "2", "Rq": ""}
+
+
+def pipeline_env(replay: bool):
+    workdir = tempfile.mkdtemp(prefix="trip-replay-")
+    os.makedirs(os.path.join(workdir, "static"), exist_ok=True)
+    os.chdir(workdir)  # add_all mounts ./static
+    os.environ.update({
+        "CACHE_PATH": os.path.join(workdir, "replay_cache.sqlite3"),
+        "RESULT_CACHE_TTL": "0",
+        "SEARCH_CACHE_TTL": "0",
+        "RESEARCH_CACHE_TTL": "0",
+        "LLM_CACHE_TTL": "0",
+        "RQ_MATCH_THRESHOLD": "0",
+        "LITELLM_LOCAL_MODEL_COST_MAP": "True",
+    })
+    if replay:
+        # no real keys are needed; every call is answered from the cassette
+        os.environ.setdefault("OPENAI_API_KEY", "replay")
+        os.environ.setdefault("SERPER_API_KEY", "replay")
+
+
+def post_set_task(body: dict) -> tuple:
+    """
+    One /set_task through the app in this process; returns (response json, seconds).
+    """
+    import add_all
+    from fastapi.testclient import TestClient
+
+    with TestClient(add_all.app) as client:
+        start = time.perf_counter()
+        response = client.post("/set_task", json=body)
+        seconds = time.perf_counter() - start
+    response.raise_for_status()
+    return response.json(), seconds
+
+
+def digest(result: dict) -> str:
+    return hashlib.sha256(result["result"].encode("utf-8")).hexdigest()
+
+
+def record(path: str, body: dict):
+    pipeline_env(replay=False)
+    with Cassette(path, mode="record") as cassette:
+        result, seconds = post_set_task(body)
+        cassette.meta.update(body=body, result_sha256=digest(result), seconds=round(seconds, 2))
+    print(f"Recorded {cassette.calls['llm']} LLM and {cassette.calls['serper']} Serper calls "
+          f"in {seconds:.2f}s to {path}")
+
+
+def replay(path: str, iterations: int) -> bool:
+    pipeline_env(replay=True)
+    ok = True
+    with Cassette(path, mode="replay") as cassette:
+        for iteration in range(1, iterations + 1):
+            result, seconds = post_set_task(cassette.meta["body"])
+            same = digest(result) == cassette.meta.get("result_sha256")
+            ok = ok and same
+            print(f"run {iteration}: {'ok' if same else 'RESULT CHANGED'} in {seconds:.2f}s "
+                  f"(recorded run took {cassette.meta.get('seconds')}s)")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record or replay a /set_task run of add_all.")
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("cassette")
+    parser.add_argument("--body", type=json.loads, default=DEFAULT_BODY, help="TaskRequest JSON (record only)")
+    parser.add_argument("--iterations", type=int, default=1, help="replay runs")
+    args = parser.parse_args()
+
+    cassette = os.path.abspath(args.cassette)
+    if args.mode == "record":
+        record(cassette, args.body)
+    elif not replay(cassette, args.iterations):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
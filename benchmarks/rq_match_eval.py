@@ -0,0 +1,76 @@
+"""
+Precision/recall of the Rq near-duplicate matcher (rq_match.py) on a labeled sample.
+
+Each line of the sample is {"a": "...", "b": "...", "same": true|false}: whether
+a result generated for Rq `a` is an acceptable answer for Rq `b`. A pair counts
+as matched when similarity(prepare(a), prepare(b)) >= threshold.
+
+Run from the repository root:
+
+    python benchmarks/rq_match_eval.py --thresholds 0.6,0.7,0.8,0.9
+
+Use --show-errors to list the pairs a threshold gets wrong.
+"""
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from rq_match import RQ_MATCH_THRESHOLD, prepare, similarity  # noqa: E402
+
+DEFAULT_SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rq_pairs.jsonl")
+
+
+def load_pairs(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def score_pairs(pairs: list) -> list:
+    return [(similarity(prepare(pair["a"]), prepare(pair["b"])), bool(pair["same"]), pair) for pair in pairs]
+
+
+def evaluate(scored: list, threshold: float) -> dict:
+    tp = sum(1 for score, same, _ in scored if same and score >= threshold)
+    fp = sum(1 for score, same, _ in scored if not same and score >= threshold)
+    fn = sum(1 for score, same, _ in scored if same and score < threshold)
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        "threshold": threshold,
+        "tp": tp, "fp": fp, "fn": fn,
+        "precision": round(precision, 3),
+        "recall": round(recall, 3),
+        "f1": round(f1, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precision/recall of the Rq matcher per similarity threshold.")
+    parser.add_argument("--sample", default=DEFAULT_SAMPLE)
+    parser.add_argument("--thresholds", type=lambda s: [float(v) for v in s.split(",")],
+                        default=[0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95])
+    parser.add_argument("--show-errors", action="store_true")
+    args = parser.parse_args()
+
+    scored = score_pairs(load_pairs(args.sample))
+    print(f"{len(scored)} pairs, {sum(same for _, same, _ in scored)} labeled same "
+          f"(current RQ_MATCH_THRESHOLD={RQ_MATCH_THRESHOLD})")
+    print(f"{'threshold':>9} {'precision':>9} {'recall':>7} {'f1':>6} {'tp':>4} {'fp':>4} {'fn':>4}")
+    for threshold in args.thresholds:
+        row = evaluate(scored, threshold)
+        print(f"{threshold:>9} {row['precision']:>9} {row['recall']:>7} {row['f1']:>6} "
+              f"{row['tp']:>4} {row['fp']:>4} {row['fn']:>4}")
+        if args.show_errors:
+            for score, same, pair in scored:
+                if same != (score >= threshold):
+                    label = "missed" if same else "false match"
+                    print(f"    {label:<11} {score:.3f}  {pair['a']!r} ~ {pair['b']!r}")
+
+
+if __name__ == "__main__":
+    main()
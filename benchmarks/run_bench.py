@@ -0,0 +1,223 @@
+"""
+Offline end-to-end benchmark of the trip apps.
+
+Each app is started under uvicorn (serve_app.py) with the LLM and Serper
+replaced by the fake services in fake_services.py, then `POST /set_task` is
+driven at several concurrency levels. Latency percentiles (p50/p95/p99) and
+throughput are printed and written as JSON.
+
+Run from the repository root:
+
+    python benchmarks/run_bench.py --concurrency 1,4,16 --requests 32 \
+        --llm-latency lognormal:1.0:0.4 --serper-latency lognormal:0.3:0.3
+
+By default the result/search/research/LLM caches of add_all are disabled so every
+request runs the whole pipeline; pass --warm-cache to keep them on.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from fake_services import FakeServices
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_APPS = ["add_all.py", "app_3.py", "app4.py", "Groq/trip/app.py"]
+BASE_REQUEST = {"task_type": "Satun", "style": "Natural", "cost": "Low", "day": "2", "adults": "2"}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(samples: list, q: float) -> float:
+    """
+    Nearest-rank percentile.
+    """
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)], 4)
+
+
+def app_env(fake_url: str, workdir: str, warm_cache: bool) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_API_BASE": fake_url + "/v1",
+        "OPENAI_BASE_URL": fake_url + "/v1",
+        "OPENAI_MODEL_NAME": env.get("OPENAI_MODEL_NAME", "gpt-4o-mini"),
+        "SERPER_API_KEY": "benchmark",
+        "SERPER_BASE_URL": fake_url,
+        "CACHE_PATH": os.path.join(workdir, "bench_cache.sqlite3"),
+        "LITELLM_LOCAL_MODEL_COST_MAP": "True",
+        "CREWAI_DISABLE_TELEMETRY": "true",
+        "OTEL_SDK_DISABLED": "true",
+        "PYTHONPATH": ROOT,
+    })
+    if not warm_cache:
+        env["RESULT_CACHE_TTL"] = "0"
+        env["SEARCH_CACHE_TTL"] = "0"
+        env["RESEARCH_CACHE_TTL"] = "0"
+        env["LLM_CACHE_TTL"] = "0"
+    return env
+
+
+def start_app(app: str, port: int, fake_url: str, env: dict, workdir: str, log):
+    command = [
+        sys.executable, os.path.join(ROOT, "benchmarks", "serve_app.py"),
+        os.path.join(ROOT, app), "--port", str(port), "--serper-url", fake_url,
+    ]
+    # cwd with an empty ./static, which add_all mounts
+    return subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_ready(url: str, process, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"app exited with code {process.returncode}")
+        try:
+            if httpx.get(url + "/openapi.json", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("app did not start in time")
+
+
+async def load(url: str, concurrency: int, total: int, timeout: float, offset: int) -> dict:
+    """
+    Send `total` requests with at most `concurrency` in flight. Every request has
+    its own Rq so neither the result cache nor request coalescing hides the work.
+    """
+    slots = asyncio.Semaphore(concurrency)
+    latencies, errors = [], {}
+
+    async def one(client, index):
+        body = dict(BASE_REQUEST, Rq=f"benchmark request {offset + index}")
+        async with slots:
+            start = time.perf_counter()
+            try:
+                response = await client.post(url + "/set_task", json=body)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+        if status == 200:
+            latencies.append(elapsed)
+        else:
+            errors[str(status)] = errors.get(str(status), 0) + 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(client, index) for index in range(total)))
+        wall = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "ok": len(latencies),
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "rps": round(len(latencies) / wall, 3) if wall else None,
+        "mean": round(statistics.fmean(latencies), 4) if latencies else None,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+    }
+
+
+def bench_app(app: str, args, fake_url: str) -> list:
+    workdir = tempfile.mkdtemp(prefix="trip-bench-")
+    os.makedirs(os.path.join(workdir, "static"), exist_ok=True)
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    with open(os.path.join(workdir, "app.log"), "wb") as log:
+        process = start_app(app, port, fake_url, app_env(fake_url, workdir, args.warm_cache), workdir, log)
+        try:
+            wait_ready(url, process, args.startup_timeout)
+            rows, offset = [], 0
+            if args.warmup:
+                asyncio.run(load(url, 1, args.warmup, args.timeout, offset=-args.warmup))
+            for concurrency in args.concurrency:
+                total = max(args.requests, concurrency)
+                row = asyncio.run(load(url, concurrency, total, args.timeout, offset))
+                offset += total
+                rows.append(dict(row, app=app))
+                print(format_row(row, app), flush=True)
+            return rows
+        except RuntimeError as e:
+            print(f"{app}: {e} (see {log.name})", flush=True)
+            return [{"app": app, "error": str(e)}]
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def format_row(row: dict, app: str) -> str:
+    def ms(value):
+        return "-" if value is None else f"{value * 1000:8.0f}"
+    return (
+        f"{app:<18} c={row['concurrency']:<3} ok={row['ok']:<4} err={sum(row['errors'].values()):<3} "
+        f"p50={ms(row['p50'])}ms p95={ms(row['p95'])}ms p99={ms(row['p99'])}ms rps={row['rps']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the trip apps against a fake LLM and Serper.")
+    parser.add_argument("--apps", nargs="+", default=DEFAULT_APPS)
+    parser.add_argument("--concurrency", type=lambda s: [int(v) for v in s.split(",")], default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--llm-latency", default="lognormal:1.0:0.4")
+    parser.add_argument("--serper-latency", default="lognormal:0.3:0.3")
+    parser.add_argument("--warm-cache", action="store_true")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--startup-timeout", type=float, default=90)
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args()
+
+    services = FakeServices(llm_latency=args.llm_latency, serper_latency=args.serper_latency).start()
+    results = []
+    try:
+        for app in args.apps:
+            results.extend(bench_app(app, args, services.url))
+    finally:
+        services.stop()
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "settings": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "llm_latency": args.llm_latency,
+            "serper_latency": args.serper_latency,
+            "warm_cache": args.warm_cache,
+        },
+        "fake_calls": services.counts,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
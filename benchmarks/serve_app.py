@@ -0,0 +1,58 @@
+"""
+Start one of the trip apps under uvicorn with its Serper calls sent to a fake
+Serper (used by run_bench.py).
+
+Some apps call https://google.serper.dev directly (app4.search_serper, the
+stock SerperDevTool), so requests to that host are rewritten to --serper-url.
+The LLM is redirected through the OPENAI_API_BASE / OPENAI_BASE_URL
+environment variables set by the runner.
+
+    python benchmarks/serve_app.py add_all.py --port 8000 --serper-url http://127.0.0.1:8790
+"""
+import argparse
+import importlib.util
+import os
+import sys
+
+import requests
+import uvicorn
+
+SERPER_HOST = "https://google.serper.dev"
+
+
+def redirect_serper(serper_url: str):
+    original = requests.Session.request
+
+    def request(self, method, url, *args, **kwargs):
+        if isinstance(url, str) and url.startswith(SERPER_HOST):
+            url = serper_url.rstrip("/") + url[len(SERPER_HOST):]
+        return original(self, method, url, *args, **kwargs)
+
+    requests.Session.request = request
+
+
+def load_app(path: str):
+    path = os.path.abspath(path)
+    sys.path.insert(0, os.path.dirname(path))
+    name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module.app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a trip app against a fake Serper.")
+    parser.add_argument("app", help="path to the app file, e.g. add_all.py or Groq/trip/app.py")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--serper-url", required=True)
+    args = parser.parse_args()
+
+    redirect_serper(args.serper_url)
+    app = load_app(args.app)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
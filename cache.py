@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# ---------- Cache settings ----------
+CACHE_PATH = os.getenv("CACHE_PATH", "trip_cache.sqlite3")
+
+
+def normalize_text(text) -> str:
+    """
+    Lower-case and collapse whitespace so "Vegetarian  food" and "vegetarian food" match.
+    """
+    return re.sub(r"\s+", " ", str(text or "")).strip().lower()
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def canonical_key(fields: dict) -> str:
+    """
+    Stable key for a dict of already-normalized fields.
+    """
+    return hash_text(json.dumps(fields, sort_keys=True, ensure_ascii=False))
+
+
+class SQLiteCache:
+    """
+    Persistent key/value cache on SQLite with a TTL, LRU eviction and hit/miss counters.
+
+    Values are stored as JSON. A `ttl` of 0 disables the cache (every lookup misses
+    and nothing is written).
+    """
+
+    def __init__(self, table: str, ttl: int, max_entries: int, path: str = CACHE_PATH):
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed_at)")
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get(self, key: str):
+        """
+        Return the cached value, or None on a miss or an expired entry.
+        """
+        if not self.enabled:
+            self.misses += 1
+            return None
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] < now - self.ttl:
+                if row is not None:
+                    self._db.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._db.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value):
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now),
+            )
+            # LRU eviction: keep only the `max_entries` most recently used rows
+            self._db.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def ttl_left(self, key: str):
+        """
+        Seconds until the entry expires, or None if it is missing or already expired.
+        Does not count as a lookup and does not refresh the LRU position.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        left = row[0] + self.ttl - time.time()
+        return left if left > 0 else None
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute(f"DELETE FROM {self.table}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+            "ttl": self.ttl,
+            "max_entries": self.max_entries,
+        }
@@ -0,0 +1,141 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; without it only gzip is offered
+    brotli = None
+
+# ---------- Delivery settings ----------
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))   # smaller bodies are sent as-is
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+COMPRESS_CACHE_SIZE = int(os.getenv("COMPRESS_CACHE_SIZE", "256"))  # compressed GET bodies kept, by ETag
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "html": "text/html; charset=utf-8",
+    "md": "text/markdown; charset=utf-8",
+}
+
+
+def public_result(record: dict) -> dict:
+    """
+    The JSON form of a stored result: everything except the Markdown source.
+    """
+    return {key: value for key, value in record.items() if key != "markdown"}
+
+
+def render_body(record: dict, fmt: str) -> bytes:
+    if fmt == "html":
+        return record["result"].encode("utf-8")
+    if fmt == "md":
+        return record.get("markdown", "").encode("utf-8")
+    return json.dumps(public_result(record), ensure_ascii=False).encode("utf-8")
+
+
+def content_etag(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+def choose_encoding(accept_encoding: str):
+    """
+    Pick "br" or "gzip" from an Accept-Encoding header (honouring q=0), or None.
+    """
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+    wildcard = accepted.get("*", 0.0)
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressedCache:
+    """
+    LRU of compressed bodies keyed by (ETag, encoding), so a popular stored result
+    fetched again and again is compressed once. Only the compressed bytes are kept.
+    """
+
+    def __init__(self, size: int = COMPRESS_CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, etag: str, body: bytes, encoding: str) -> bytes:
+        key = (etag, encoding)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        compressed = compress(body, encoding)
+        if self.size > 0:
+            with self._lock:
+                self._entries[key] = compressed
+                while len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+        return compressed
+
+
+compressed_cache = CompressedCache()
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    for tag in (if_none_match or "").split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        tag = tag.removeprefix("W/").strip('"')
+        # an encoded variant ("<hash>-gzip") has the same content
+        if tag.split("-", 1)[0] == etag:
+            return True
+    return False
+
+
+def deliver(http_request, record: dict, fmt: str = "json", conditional: bool = True) -> Response:
+    """
+    Send a result as json, html or md with a content-hash ETag and gzip/brotli
+    chosen from the client's Accept-Encoding.
+
+    With `conditional` (GET requests), a matching If-None-Match returns 304.
+    """
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid format, use json, html or md")
+
+    body = render_body(record, fmt)
+    etag = content_etag(body)
+    headers = {"ETag": f'"{etag}"', "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if conditional and _etag_matches(http_request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    encoding = choose_encoding(http_request.headers.get("accept-encoding"))
+    if encoding and len(body) >= COMPRESS_MIN_SIZE:
+        # POST bodies carry the per-request `usage`, so they are almost never sent twice
+        body = compressed_cache.get(etag, body, encoding) if conditional else compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+        headers["ETag"] = f'"{etag}-{encoding}"'
+    return Response(content=body, media_type=MEDIA_TYPES[fmt], headers=headers)
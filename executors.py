@@ -0,0 +1,63 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import CREWS_IN_FLIGHT, CREWS_QUEUED
+from usage import current_usage
+
+# ---------- Executor settings ----------
+# crew.kickoff() runs for minutes, Serper calls for about a second; separate pools
+# keep short searches from waiting behind long crews.
+CREW_WORKERS = int(os.getenv("CREW_WORKERS", "8"))
+IO_WORKERS = int(os.getenv("IO_WORKERS", "16"))
+
+crew_executor = ThreadPoolExecutor(max_workers=CREW_WORKERS, thread_name_prefix="trip-crew")
+io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="trip-io")
+# guards the "crew left the queue" bookkeeping of run_crew
+_queue_lock = threading.Lock()
+
+
+async def run_blocking(func, *args, executor=None, **kwargs):
+    """
+    Run a blocking call (crew.kickoff, requests.post, ...) off the event loop.
+    Context variables (the request's usage accounting) are carried over to the worker thread.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor or io_executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+async def run_crew(crew, **kwargs):
+    """
+    Run `crew.kickoff(**kwargs)` on the crew pool so the event loop keeps serving other requests.
+    The crew's token/tool usage is counted towards the current request, if any.
+    """
+    usage = current_usage.get()
+    if usage is not None:
+        usage.track(crew)
+    dequeued = False
+
+    def leave_queue():
+        # called by the worker when it starts, or by the caller if it is cancelled first
+        nonlocal dequeued
+        with _queue_lock:
+            if not dequeued:
+                dequeued = True
+                CREWS_QUEUED.dec()
+
+    def kickoff():
+        leave_queue()
+        CREWS_IN_FLIGHT.inc()
+        try:
+            return crew.kickoff(**kwargs)
+        finally:
+            CREWS_IN_FLIGHT.dec()
+
+    CREWS_QUEUED.inc()
+    try:
+        return await run_blocking(kickoff, executor=crew_executor)
+    finally:
+        leave_queue()
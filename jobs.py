@@ -0,0 +1,124 @@
+import asyncio
+import os
+import time
+import uuid
+
+from fastapi import HTTPException
+
+# ---------- Job settings ----------
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))   # crews running at the same time
+JOB_TTL = int(os.getenv("JOB_TTL", "3600"))        # seconds a finished job is kept
+
+
+class JobStore:
+    """
+    Keep the status of background jobs and run them with at most `max_workers` at a time.
+
+    Jobs run as tasks on the server's event loop; `set_task` already hands the
+    blocking crew work to the executors, so a slot here only bounds how many
+    crews the job queue starts at once.
+    """
+
+    def __init__(self, max_workers: int = JOB_WORKERS, ttl: int = JOB_TTL):
+        self.ttl = ttl
+        self._slots = asyncio.Semaphore(max_workers)
+        self._jobs = {}
+        self._tasks = set()
+
+    def submit(self, handler, request) -> dict:
+        """
+        Register a new job and schedule `await handler(request)` once a slot is free.
+        """
+        self._purge()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "status": "queued",
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        self._jobs[job["job_id"]] = job
+        task = asyncio.get_running_loop().create_task(self._run(job, handler, request))
+        # keep a reference so the task is not garbage-collected while it waits for a slot
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return dict(job)
+
+    def get(self, job_id: str):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        job = dict(job)
+        if job["status"] == "queued":
+            # Number of jobs that were queued before this one and have not started yet
+            job["queue_position"] = sum(
+                1 for other in self._jobs.values()
+                if other["status"] == "queued" and other["created_at"] <= job["created_at"]
+            )
+        return job
+
+    def stats(self) -> dict:
+        """
+        Number of jobs per status; "queued" is the depth of the job queue.
+        """
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        for job in self._jobs.values():
+            counts[job["status"]] += 1
+        return counts
+
+    async def _run(self, job: dict, handler, request):
+        async with self._slots:
+            job["status"] = "running"
+            job["started_at"] = time.time()
+            try:
+                job["result"] = await handler(request)
+                job["status"] = "done"
+            except HTTPException as e:
+                job["error"] = e.detail
+                job["status"] = "failed"
+            except Exception as e:
+                job["error"] = str(e)
+                job["status"] = "failed"
+            finally:
+                job["finished_at"] = time.time()
+
+    def _purge(self):
+        """
+        Drop finished jobs older than the TTL so the store does not grow forever.
+        """
+        deadline = time.time() - self.ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finished_at"] is not None and job["finished_at"] < deadline
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+def register_job_routes(app, request_model, handler, validate=None, store: JobStore = None) -> JobStore:
+    """
+    Add `POST /jobs` and `GET /jobs/{job_id}` to a FastAPI app.
+
+    `handler` is the app's `set_task` coroutine function; `validate` (optional) is
+    called with the request before the job is queued so bad options fail with 400
+    right away instead of inside the job.
+    """
+    store = store or JobStore()
+
+    @app.post("/jobs", status_code=202)
+    async def create_job(request: request_model):
+        if validate is not None:
+            validate(request)
+        job = store.submit(handler, request)
+        return {"job_id": job["job_id"], "status": job["status"]}
+
+    @app.get("/jobs/{job_id}")
+    async def get_job(job_id: str):
+        job = store.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+
+    return store
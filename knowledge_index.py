@@ -0,0 +1,186 @@
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Type
+
+from crewai.tools import BaseTool
+from pydantic import BaseModel, Field
+
+# ---------- Knowledge index settings ----------
+KNOWLEDGE_DIR = os.getenv(
+    "KNOWLEDGE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "Groq", "trip", "knowledge"),
+)
+# How often (seconds) a search checks the corpus directory for new/changed files
+KNOWLEDGE_RESCAN_INTERVAL = float(os.getenv("KNOWLEDGE_RESCAN_INTERVAL", "30"))
+KNOWLEDGE_EXTENSIONS = (".txt", ".md")
+# Files that are not travel facts: the crewAI project template ("User name is John Doe ...")
+KNOWLEDGE_EXCLUDE = {
+    name.strip() for name in os.getenv("KNOWLEDGE_EXCLUDE", "user_preference.txt").split(",") if name.strip()
+}
+
+# Thai is written without spaces and its vowel/tone marks are not \w, so a Thai run is one
+# token here and is split into overlapping character bigrams ("ทะเลน้อย" -> "ทะ", "ะเ", ...)
+_TOKEN = re.compile(r"[\u0e00-\u0e7f]+|[^\W\u0e00-\u0e7f]+", re.UNICODE)
+_THAI = re.compile(r"[\u0e00-\u0e7f]")
+THAI_NGRAM = 2
+# Words too common to say anything about a passage ("hotels in Trang" must not match on "in")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "i", "in", "is", "it",
+    "its", "me", "my", "of", "on", "or", "that", "the", "their", "this", "to", "was", "what", "where",
+    "which", "who", "with", "you", "your",
+}
+
+
+def tokenize(text: str) -> list:
+    tokens = []
+    for word in _TOKEN.findall(text.lower()):
+        if _THAI.match(word):
+            if len(word) <= THAI_NGRAM:
+                tokens.append(word)
+            else:
+                tokens.extend(word[i:i + THAI_NGRAM] for i in range(len(word) - THAI_NGRAM + 1))
+        elif word not in STOPWORDS:
+            tokens.append(word)
+    return tokens
+
+
+class KnowledgeIndex:
+    """
+    BM25 inverted index over the .txt/.md files of a corpus directory.
+
+    Each paragraph (block separated by a blank line) is one document, so a hit
+    points at the relevant passage rather than a whole file. `refresh()` only
+    re-reads files whose size or modification time changed and drops files that
+    were deleted; `search()` calls it at most every `rescan_interval` seconds.
+    """
+
+    def __init__(self, directory: str = KNOWLEDGE_DIR, rescan_interval: float = KNOWLEDGE_RESCAN_INTERVAL,
+                 k1: float = 1.5, b: float = 0.75):
+        self.directory = directory
+        self.rescan_interval = rescan_interval
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._files = {}       # path -> (mtime, size, [doc ids])
+        self._docs = {}        # doc id -> (path, text, length)
+        self._postings = {}    # term -> {doc id: term frequency}
+        self._total_length = 0
+        self._next_id = 0
+        self._last_scan = 0.0
+
+    def refresh(self):
+        """
+        Bring the index up to date with the corpus directory.
+        """
+        seen = {}
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.lower().endswith(KNOWLEDGE_EXTENSIONS) and name not in KNOWLEDGE_EXCLUDE:
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    seen[path] = (stat.st_mtime, stat.st_size)
+
+        with self._lock:
+            for path in list(self._files):
+                if path not in seen:
+                    self._remove_file(path)
+            for path, (mtime, size) in seen.items():
+                indexed = self._files.get(path)
+                if indexed is not None and indexed[:2] == (mtime, size):
+                    continue
+                if indexed is not None:
+                    self._remove_file(path)
+                self._add_file(path, mtime, size)
+            self._last_scan = time.monotonic()
+
+    def _add_file(self, path: str, mtime: float, size: int):
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            paragraphs = [p.strip() for p in re.split(r"\n\s*\n", f.read()) if p.strip()]
+        doc_ids = []
+        for text in paragraphs:
+            terms = Counter(tokenize(text))
+            if not terms:
+                continue
+            doc_id = self._next_id
+            self._next_id += 1
+            length = sum(terms.values())
+            self._docs[doc_id] = (path, text, length)
+            self._total_length += length
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+            doc_ids.append(doc_id)
+        self._files[path] = (mtime, size, doc_ids)
+
+    def _remove_file(self, path: str):
+        for doc_id in self._files.pop(path)[2]:
+            _, text, length = self._docs.pop(doc_id)
+            self._total_length -= length
+            for term in set(tokenize(text)):
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self._postings[term]
+
+    def _refresh_if_due(self):
+        if time.monotonic() - self._last_scan >= self.rescan_interval:
+            self.refresh()
+
+    def document_count(self) -> int:
+        self._refresh_if_due()
+        with self._lock:
+            return len(self._docs)
+
+    def search(self, query: str, top_k: int = 5) -> list:
+        """
+        Return up to `top_k` (score, path, passage) tuples, best first.
+        """
+        self._refresh_if_due()
+
+        with self._lock:
+            n_docs = len(self._docs)
+            if not n_docs:
+                return []
+            avg_length = self._total_length / n_docs
+            scores = Counter()
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    length = self._docs[doc_id][2]
+                    norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avg_length))
+                    scores[doc_id] += idf * norm
+            return [
+                (round(score, 4), self._docs[doc_id][0], self._docs[doc_id][1])
+                for doc_id, score in scores.most_common(top_k)
+            ]
+
+
+class LocalKnowledgeToolInput(BaseModel):
+    """Input schema for LocalKnowledgeTool."""
+    query: str = Field(..., description="What to look up, e.g. 'Songkhla signature dish' or 'Satun islands'.")
+
+
+class LocalKnowledgeTool(BaseTool):
+    name: str = "Search local travel knowledge"
+    description: str = (
+        "Look up Southern Thailand travel facts (attractions, opening hours, signature dishes, "
+        "accommodation names) in the local knowledge base of curated notes."
+    )
+    args_schema: Type[BaseModel] = LocalKnowledgeToolInput
+    index: KnowledgeIndex = Field(default_factory=KnowledgeIndex, exclude=True)
+    top_k: int = 5
+
+    def _run(self, query: str) -> str:
+        results = self.index.search(query, self.top_k)
+        if not results:
+            return f"No local results for: {query}. Use the internet search instead."
+        return "\n\n".join(
+            f"[{os.path.basename(path)}] {passage}" for _, path, passage in results
+        )
@@ -0,0 +1,89 @@
+import json
+import os
+
+from crewai import LLM
+from crewai.utilities.llm_utils import create_llm
+
+from cache import SQLiteCache, hash_text
+
+# ---------- LLM completion cache settings ----------
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "604800"))            # 0 = off
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000"))
+# Agents whose LLM calls go through the cache (comma separated; empty = none). The researcher is
+# left out by default: it is asked for up-to-date findings, which a week-old answer is not.
+LLM_CACHE_AGENTS = {
+    name.strip().lower() for name in os.getenv("LLM_CACHE_AGENTS", "writer").split(",") if name.strip()
+}
+
+# Attributes of the LLM that change its answer; credentials, endpoints and timeouts do not
+KEY_PARAMS = (
+    "temperature", "top_p", "n", "stop", "max_tokens", "max_completion_tokens", "presence_penalty",
+    "frequency_penalty", "logit_bias", "response_format", "seed", "logprobs", "top_logprobs", "reasoning_effort",
+)
+
+# Completions of single LLM calls, shared by every agent that has the cache turned on
+llm_cache = SQLiteCache(table="llm_completions", ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES)
+
+
+def completion_key(model: str, params: dict, messages, tools=None) -> str:
+    """
+    Key for one LLM call: the model, the sampling parameters and the full message list.
+    """
+    return hash_text(json.dumps(
+        {"model": model, "params": params, "messages": messages, "tools": tools},
+        sort_keys=True, ensure_ascii=False, default=str,
+    ))
+
+
+class CachedLLM(LLM):
+    """
+    crewAI LLM that answers byte-identical calls from a SQLite cache.
+
+    A crew run makes many calls that repeat across requests even when the
+    whole trip differs (the researcher's first step for a province, the writer
+    prompt for the same research), so those are replayed instead of paid for.
+    Calls that execute functions themselves (`available_functions`) are never cached.
+    """
+
+    cache = llm_cache
+
+    @classmethod
+    def from_llm(cls, llm: LLM, cache: SQLiteCache = llm_cache) -> "CachedLLM":
+        """
+        Wrap a configured LLM (model, endpoint and key from the environment) without rebuilding it.
+        """
+        cached = cls.__new__(cls)
+        cached.__dict__.update(llm.__dict__)
+        cached.cache = cache
+        return cached
+
+    def completion_params(self) -> dict:
+        params = {name: getattr(self, name, None) for name in KEY_PARAMS}
+        params.update(getattr(self, "additional_params", None) or {})
+        return {name: value for name, value in params.items() if value not in (None, [], {})}
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, **kwargs):
+        if available_functions or not self.cache.enabled:
+            return super().call(messages, tools, callbacks, available_functions, **kwargs)
+        if isinstance(messages, str):
+            messages = [{"role": "user", "content": messages}]
+
+        key = completion_key(self.model, self.completion_params(), messages, tools)
+        answer = self.cache.get(key)
+        if answer is not None:
+            return answer
+        answer = super().call(messages, tools, callbacks, available_functions, **kwargs)
+        if isinstance(answer, str) and answer.strip():
+            self.cache.set(key, answer)
+        return answer
+
+
+def agent_llm(agent: str):
+    """
+    LLM for one agent: a CachedLLM if the cache is on and `agent` is listed in
+    LLM_CACHE_AGENTS, otherwise None so crewAI uses its default LLM.
+    """
+    if not llm_cache.enabled or agent.lower() not in LLM_CACHE_AGENTS:
+        return None
+    llm = create_llm(None)
+    return CachedLLM.from_llm(llm) if isinstance(llm, LLM) else llm
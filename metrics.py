@@ -0,0 +1,192 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from fastapi.responses import PlainTextResponse
+
+# Upper bounds (seconds) of the stage histogram: from option validation (ms) to a full crew (minutes)
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    )
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple((name, labels[name]) for name in self.labelnames)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=STAGE_BUCKETS, registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, observations = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, observations + 1)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, (counts, total, observations) in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(key + (('le', bound),))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {observations}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {observations}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# ---------- Metrics shared by the apps ----------
+STAGE_SECONDS = Histogram(
+    "trip_stage_seconds",
+    "Time spent in each stage of a trip request "
+    "(validation, construction, search_serper, research, writer, markdown).",
+    ["stage"],
+)
+STAGE_ERRORS = Counter("trip_stage_errors_total", "Requests that failed, by the stage they failed in.", ["stage"])
+CREWS_IN_FLIGHT = Gauge("trip_crews_in_flight", "Crews currently running on the crew executor.")
+CREWS_QUEUED = Gauge("trip_crews_queued", "Crews waiting for a free crew worker thread.")
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """
+    Time a block as one stage; an exception counts as an error of that stage.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+class StageTimer:
+    """
+    Split the run of a multi-task crew into stages (one per task) using the
+    crew's task_callback. `then` is called with each task output afterwards, so
+    it can be chained with ProgressStream.task_callback.
+    """
+
+    def __init__(self, stages, then=None):
+        self.stages = list(stages)
+        self.then = then
+        self._finished = 0
+        self._mark = time.perf_counter()
+
+    def before_kickoff(self, inputs):
+        """
+        Crew before_kickoff callback: start the clock when a worker picks the crew up,
+        so time spent waiting in the crew queue is not counted as the first stage.
+        """
+        self._mark = time.perf_counter()
+        return inputs
+
+    def task_callback(self, output):
+        now = time.perf_counter()
+        if self._finished < len(self.stages):
+            STAGE_SECONDS.observe(now - self._mark, stage=self.stages[self._finished])
+        self._finished += 1
+        self._mark = now
+        if self.then is not None:
+            self.then(output)
+
+    def fail(self):
+        """
+        Count an error for the stage that was running when the crew raised.
+        """
+        if self._finished < len(self.stages):
+            STAGE_ERRORS.inc(stage=self.stages[self._finished])
+
+
+def register_metrics_route(app, before_scrape=None, registry: Registry = None):
+    """
+    Add `GET /metrics` (Prometheus text format) to a FastAPI app.
+
+    `before_scrape` (optional) is called first to refresh gauges that are read
+    from elsewhere, such as cache hit ratios.
+    """
+    registry = registry or REGISTRY
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        if before_scrape is not None:
+            before_scrape()
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+    return registry
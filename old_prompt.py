@@ -3,8 +3,14 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from crewai import Agent, Crew, Task, Process 
 from crewai_tools import SerperDevTool
+import os
 
-search_tools = SerperDevTool()
+from executors import run_crew
+from jobs import register_job_routes
+
+search_tools = SerperDevTool(
+    base_url=os.getenv("SERPER_BASE_URL", "https://google.serper.dev"),  # Serper จำลองในเครื่องสำหรับทดสอบโหลด
+)
 
 app = FastAPI()
 
@@ -117,6 +123,10 @@ async def set_task(request: TaskRequest):
     )
 
     # เริ่มทำงานและรับผลลัพธ์
-    result = crew.kickoff()
+    result = await run_crew(crew)
 
     return {"message": "Task completed!", "result": str(result)}
+
+
+# ---------- Job mode: POST /jobs → job id, GET /jobs/{job_id} → status/result ----------
+job_store = register_job_routes(app, TaskRequest, set_task)
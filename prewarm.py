@@ -0,0 +1,172 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from cache import CACHE_PATH
+
+# ---------- Pre-warm settings ----------
+PREWARM_TOP_N = int(os.getenv("PREWARM_TOP_N", "0"))                 # 0 = pre-warming off
+PREWARM_WINDOW = os.getenv("PREWARM_WINDOW", "01:00-06:00")           # off-peak hours (server local time)
+PREWARM_RATE = float(os.getenv("PREWARM_RATE", "2"))                  # crews started per minute at most
+PREWARM_MIN_TTL_LEFT = int(os.getenv("PREWARM_MIN_TTL_LEFT", "43200"))  # refresh entries expiring sooner than this
+PREWARM_CHECK_INTERVAL = int(os.getenv("PREWARM_CHECK_INTERVAL", "600"))
+PREWARM_STATS_MAX_ROWS = int(os.getenv("PREWARM_STATS_MAX_ROWS", "5000"))
+PREWARM_STATS_HALF_LIFE = float(os.getenv("PREWARM_STATS_HALF_LIFE", "604800"))  # seconds until a count weighs half
+
+logger = logging.getLogger("prewarm")
+
+
+class RequestStats:
+    """
+    How often each request group (every field except the free-text Rq) has been
+    asked for, as a count that halves every `half_life` seconds so groups nobody
+    asks for any more drop out of the ranking.
+
+    Stored next to the caches so the counts survive restarts and can be read by
+    the pre-warm job. Only the `max_rows` most recently seen groups are kept.
+    """
+
+    def __init__(self, table: str = "request_group_stats", path: str = CACHE_PATH,
+                 max_rows: int = PREWARM_STATS_MAX_ROWS, half_life: float = PREWARM_STATS_HALF_LIFE):
+        self.table = table
+        self.max_rows = max_rows
+        self.half_life = half_life
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, request TEXT NOT NULL, "
+                "count REAL NOT NULL, last_seen REAL NOT NULL)"
+            )
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS {table}_last_seen ON {table} (last_seen)")
+
+    def _decay(self, seconds: float) -> float:
+        return 0.5 ** (max(0.0, seconds) / self.half_life) if self.half_life > 0 else 1.0
+
+    def record(self, key: str, request: dict):
+        """
+        Count one request of the group `key`; `request` is the group's request with an empty Rq.
+        """
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute(f"SELECT count, last_seen FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            count = 1.0 + (row[0] * self._decay(now - row[1]) if row else 0.0)
+            self._db.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, request, count, last_seen) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(request, ensure_ascii=False), count, now),
+            )
+            if not row:
+                self._db.execute(
+                    f"DELETE FROM {self.table} WHERE key IN ("
+                    f"SELECT key FROM {self.table} ORDER BY last_seen DESC LIMIT -1 OFFSET ?)",
+                    (self.max_rows,),
+                )
+
+    def top(self, n: int) -> list:
+        """
+        The `n` most requested (key, request dict, decayed count), most popular first.
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(f"SELECT key, request, count, last_seen FROM {self.table}").fetchall()
+        ranked = sorted(
+            ((key, request, count * self._decay(now - last_seen)) for key, request, count, last_seen in rows),
+            key=lambda row: row[2], reverse=True,
+        )
+        return [(key, json.loads(request), round(count, 2)) for key, request, count in ranked[:n]]
+
+
+def in_window(window: str, now: datetime = None) -> bool:
+    """
+    True if `now` falls inside "HH:MM-HH:MM"; the window may wrap past midnight.
+    """
+    start, end = (datetime.strptime(part.strip(), "%H:%M").time() for part in window.split("-"))
+    current = (now or datetime.now()).time()
+    if start <= end:
+        return start <= current < end
+    return current >= start or current < end
+
+
+class Prewarmer:
+    """
+    Regenerate the most requested results before they are needed.
+
+    `warm(request_dict)` is the app's coroutine that runs the crew and stores the
+    result. Entries with more than `min_ttl_left` seconds to live are left alone,
+    crews are started at most `rate` per minute (one at a time), and the job
+    only runs inside the off-peak `window`.
+    """
+
+    def __init__(self, stats: RequestStats, cache, warm, top_n: int = PREWARM_TOP_N,
+                 rate: float = PREWARM_RATE, min_ttl_left: int = PREWARM_MIN_TTL_LEFT,
+                 window: str = PREWARM_WINDOW):
+        self.stats = stats
+        self.cache = cache
+        self.warm = warm
+        self.top_n = top_n
+        self.interval = 60 / rate if rate > 0 else 0
+        self.min_ttl_left = min_ttl_left
+        self.window = window
+
+    async def run_once(self, ignore_window: bool = False) -> dict:
+        summary = {"warmed": 0, "fresh": 0, "failed": 0}
+        for key, request, count in self.stats.top(self.top_n):
+            if not ignore_window and not in_window(self.window):
+                break
+            left = self.cache.ttl_left(key)
+            if left is not None and left >= self.min_ttl_left:
+                summary["fresh"] += 1
+                continue
+
+            started = time.monotonic()
+            try:
+                await self.warm(request)
+                summary["warmed"] += 1
+            except Exception as e:
+                summary["failed"] += 1
+                logger.warning("Pre-warm failed for %s: %s", request, e)
+            # throttle: keep LLM/Serper usage of the job under `rate` crews per minute
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+        logger.info("Pre-warm finished: %s", summary)
+        return summary
+
+    async def loop(self):
+        """
+        Run forever: check every PREWARM_CHECK_INTERVAL seconds and warm while in the window.
+        """
+        while True:
+            if in_window(self.window):
+                await self.run_once()
+            await asyncio.sleep(PREWARM_CHECK_INTERVAL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm the result cache with the most requested trips.")
+    parser.add_argument("--top", type=int, default=PREWARM_TOP_N or 20)
+    parser.add_argument("--now", action="store_true", help="ignore PREWARM_WINDOW and run right away")
+    parser.add_argument("--list", action="store_true", help="only print the ranking")
+    args = parser.parse_args()
+
+    import add_all
+
+    if args.list:
+        for key, request, count in add_all.request_stats.top(args.top):
+            left = add_all.result_cache.ttl_left(key)
+            print(count, json.dumps(request, ensure_ascii=False), "cached" if left else "missing")
+        return
+
+    logging.basicConfig(level=logging.INFO)
+    prewarmer = add_all.build_prewarmer(top_n=args.top)
+    print(asyncio.run(prewarmer.run_once(ignore_window=args.now)))
+
+
+if __name__ == "__main__":
+    main()
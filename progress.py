@@ -0,0 +1,97 @@
+import asyncio
+import json
+
+from trip_schema import writer_output
+
+# Size of the pieces the writer's output is streamed in (characters)
+CHUNK_SIZE = 400
+# Tool results can be whole search pages, only the start is sent to the browser
+PREVIEW_SIZE = 300
+
+_CLOSE = object()
+
+
+def _preview(text) -> str:
+    text = str(text or "").strip()
+    return text if len(text) <= PREVIEW_SIZE else text[:PREVIEW_SIZE] + "..."
+
+
+def format_sse(event: str, data: dict) -> str:
+    """
+    Format one Server-Sent Event.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class ProgressStream:
+    """
+    Bridge CrewAI callbacks to a Server-Sent Events stream.
+
+    The callbacks fire on the crew worker thread; events are handed to the event
+    loop with call_soon_threadsafe and read back by `events()`.
+    `stages` are the crew's task names in execution order, used to announce
+    which task starts after each one finishes.
+    """
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._finished_tasks = 0
+        self._last_step = None
+        self.runner = None  # the asyncio.Task driving the crew, kept alive until the stream ends
+
+    def emit(self, event: str, data: dict):
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (event, data))
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, _CLOSE)
+
+    def step_callback(self, agent: str):
+        """
+        Return a step_callback for one agent: tool calls and thoughts become events.
+        """
+        def callback(step):
+            # CrewAI may report the same tool step twice (before and after the tool result)
+            if step is self._last_step:
+                return
+            self._last_step = step
+            if getattr(step, "tool", None):
+                self.emit("tool", {
+                    "agent": agent,
+                    "tool": step.tool,
+                    "input": _preview(step.tool_input),
+                    "result": _preview(getattr(step, "result", "")),
+                })
+            elif getattr(step, "thought", None):
+                self.emit("thought", {"agent": agent, "thought": _preview(step.thought)})
+        return callback
+
+    def task_callback(self, output):
+        """
+        Crew task_callback: announce the task transition; the last task's output is
+        streamed to the client in chunks, as Markdown also in structured mode
+        (a TripPlan is rendered the same way as the final result, not sent as JSON).
+        """
+        index = self._finished_tasks
+        self._finished_tasks += 1
+        stage = self.stages[index] if index < len(self.stages) else str(index)
+        self.emit("task_done", {"task": stage, "summary": _preview(getattr(output, "summary", ""))})
+
+        if self._finished_tasks < len(self.stages):
+            self.emit("task_started", {"task": self.stages[self._finished_tasks]})
+        else:
+            text = writer_output(output)[0]
+            for start in range(0, len(text), CHUNK_SIZE):
+                self.emit("chunk", {"text": text[start:start + CHUNK_SIZE]})
+
+    async def events(self):
+        """
+        Yield SSE-formatted events until the stream is closed.
+        """
+        while True:
+            item = await self._queue.get()
+            if item is _CLOSE:
+                break
+            event, data = item
+            yield format_sse(event, data)
@@ -0,0 +1,178 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+
+from cache import CACHE_PATH, normalize_text
+
+# ---------- Rq near-duplicate settings ----------
+RQ_MATCH_THRESHOLD = float(os.getenv("RQ_MATCH_THRESHOLD", "0"))   # cosine similarity, 0 = matching off (0.8 evaluated)
+RQ_MATCH_MAX_PER_GROUP = int(os.getenv("RQ_MATCH_MAX_PER_GROUP", "500"))
+RQ_NGRAM_SIZES = (3, 4)
+RQ_DIMENSIONS = 2 ** 20
+
+# Words that do not change what is asked for ("vegetarian food please" = "vegetarian food")
+RQ_STOPWORDS = {"please", "pls", "plz", "thanks", "thank", "you", "the", "a", "an", "and", "with", "place", "places"}
+# Thai polite particles, also when written without a space ("มังสวิรัติด้วยค่ะ")
+THAI_PARTICLES = re.compile(r"(?:ครับ|ค่ะ|คะ|จ้า|นะ|หน่อย|ด้วย)+$")
+# "no seafood" and "seafood" look alike but ask for opposite things
+NEGATIONS = {"no", "not", "without", "avoid", "non", "dont", "don't", "never", "except"}
+# "5,000 THB" and "8,000 THB" differ only in a number; numbers have to be equal
+NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+THAI_DIGITS = str.maketrans("๐๑๒๓๔๕๖๗๘๙", "0123456789")
+
+
+def rq_tokens(text) -> list:
+    """
+    Normalized words of an Rq: lower-case, punctuation removed (Thai kept), filler words dropped.
+    """
+    words = re.sub(r"[^\w\u0e00-\u0e7f']+", " ", normalize_text(text)).split()
+    words = [THAI_PARTICLES.sub("", word) for word in words]
+    return [word for word in words if word and word not in RQ_STOPWORDS]
+
+
+def is_negated(tokens: list) -> bool:
+    return any(word in NEGATIONS or "ไม่" in word for word in tokens)
+
+
+def rq_numbers(text) -> frozenset:
+    return frozenset(number.replace(",", "") for number in NUMBER.findall(normalize_text(text).translate(THAI_DIGITS)))
+
+
+def content_words(tokens: list) -> frozenset:
+    """
+    Words of an Rq without numbers, plural "s" dropped ("cafes" = "cafe").
+    """
+    return frozenset(
+        word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+        for word in tokens if not word.isdigit()
+    )
+
+
+def vectorize(text) -> dict:
+    """
+    L2-normalized sparse vector of hashed character n-grams ({dimension: weight}).
+    """
+    return _vectorize(rq_tokens(text))
+
+
+def _vectorize(tokens: list) -> dict:
+    padded = " " + " ".join(tokens) + " "
+    counts = Counter()
+    for size in RQ_NGRAM_SIZES:
+        for i in range(len(padded) - size + 1):
+            counts[zlib.crc32(padded[i:i + size].encode("utf-8")) % RQ_DIMENSIONS] += 1
+    vector = {dim: 1 + math.log(count) for dim, count in counts.items()}
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return {dim: weight / norm for dim, weight in vector.items()} if norm else {}
+
+
+def prepare(text) -> tuple:
+    """
+    (vector, negated, numbers, content words) of an Rq, the form compared by `similarity`.
+    """
+    tokens = rq_tokens(text)
+    return _vectorize(tokens), is_negated(tokens), rq_numbers(text), content_words(tokens)
+
+
+def similarity(a: tuple, b: tuple) -> float:
+    """
+    Cosine similarity of two prepared Rq texts. 0 if only one of them is negated,
+    their numbers differ, or one has every word of the other plus more
+    ("allergic to peanuts" vs "allergic to peanuts and shellfish" adds a constraint).
+    """
+    if a[1] != b[1] or a[2] != b[2]:
+        return 0.0
+    if a[3] < b[3] or b[3] < a[3]:
+        return 0.0
+    return cosine(a[0], b[0])
+
+
+def cosine(a: dict, b: dict) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(dim, 0.0) for dim, weight in a.items())
+
+
+class RqIndex:
+    """
+    Rq texts of the cached results, grouped by the rest of the request, for
+    finding a cached result whose Rq says the same thing in other words.
+
+    Rows live in SQLite next to the caches; vectors are built on first use of
+    a group and kept in memory. Only the newest `max_per_group` Rq texts of a
+    group are kept.
+    """
+
+    def __init__(self, threshold: float = RQ_MATCH_THRESHOLD, max_per_group: int = RQ_MATCH_MAX_PER_GROUP,
+                 table: str = "rq_index", path: str = CACHE_PATH):
+        self.threshold = threshold
+        self.max_per_group = max_per_group
+        self.table = table
+        self.matches_found = 0
+        self._lock = threading.Lock()
+        self._vectors = {}
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "cache_key TEXT PRIMARY KEY, group_key TEXT NOT NULL, rq TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS {table}_group ON {table} (group_key, created_at)")
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def add(self, group_key: str, rq: str, cache_key: str):
+        if not self.enabled or not rq_tokens(rq):
+            return
+        with self._lock, self._db:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO {self.table} (cache_key, group_key, rq, created_at) VALUES (?, ?, ?, ?)",
+                (cache_key, group_key, rq, time.time()),
+            )
+            self._db.execute(
+                f"DELETE FROM {self.table} WHERE group_key = ? AND cache_key IN ("
+                f"SELECT cache_key FROM {self.table} WHERE group_key = ? ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (group_key, group_key, self.max_per_group),
+            )
+            self._vectors.pop(group_key, None)  # rebuilt on the next lookup
+
+    def matches(self, group_key: str, rq: str) -> list:
+        """
+        (score, cache_key, rq) of the group's entries at least `threshold` similar, best first.
+        """
+        if not self.enabled:
+            return []
+        prepared = prepare(rq)
+        if not prepared[0]:
+            return []
+        found = [
+            (score, cache_key, text)
+            for cache_key, text, other in self._group(group_key)
+            if (score := similarity(prepared, other)) >= self.threshold
+        ]
+        if found:
+            self.matches_found += 1
+        return sorted(found, reverse=True)
+
+    def _group(self, group_key: str) -> list:
+        with self._lock:
+            vectors = self._vectors.get(group_key)
+            if vectors is None:
+                rows = self._db.execute(
+                    f"SELECT cache_key, rq FROM {self.table} WHERE group_key = ?", (group_key,)
+                ).fetchall()
+                vectors = self._vectors[group_key] = [(key, rq, prepare(rq)) for key, rq in rows]
+            return vectors
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        return {"entries": entries, "matches": self.matches_found, "threshold": self.threshold}
@@ -0,0 +1,186 @@
+import asyncio
+import os
+import random
+import time
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from crewai_tools import SerperDevTool
+
+from cache import SQLiteCache, canonical_key, normalize_text
+from usage import record_serper_call
+
+# ---------- Serper HTTP client settings ----------
+SERPER_BASE_URL = os.getenv("SERPER_BASE_URL", "https://google.serper.dev")
+SERPER_CONNECT_TIMEOUT = float(os.getenv("SERPER_CONNECT_TIMEOUT", "3"))
+SERPER_READ_TIMEOUT = float(os.getenv("SERPER_READ_TIMEOUT", "15"))
+SERPER_RETRIES = int(os.getenv("SERPER_RETRIES", "2"))
+SERPER_BACKOFF = float(os.getenv("SERPER_BACKOFF", "0.5"))      # base delay (seconds) of the jittered backoff
+SERPER_MAX_CONNECTIONS = int(os.getenv("SERPER_MAX_CONNECTIONS", "20"))
+
+# Responses worth retrying; anything else (bad key, bad request) fails right away
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Cache of raw Serper responses shared by search_serper_async and the agents' search tool.
+# Tourist-attraction results change slowly, so entries live for a week by default.
+search_cache = SQLiteCache(
+    table="serper_results",
+    ttl=int(os.getenv("SEARCH_CACHE_TTL", "604800")),
+    max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "5000")),
+)
+
+
+def search_cache_key(search_type: str, payload: dict) -> str:
+    """
+    Key for one Serper call: the endpoint plus the normalized query and search options.
+    """
+    return canonical_key({
+        "type": search_type,
+        "q": normalize_text(payload.get("q")),
+        "num": payload.get("num") or 10,  # Serper's own default
+        "gl": payload.get("gl") or "",
+        "location": payload.get("location") or "",
+        "hl": payload.get("hl") or "",
+    })
+
+
+class SerperError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class SerperClient:
+    """
+    Pooled HTTP client for Serper with connect/read timeouts, retries with jittered
+    backoff and a cap on open connections.
+
+    `search` uses a requests.Session (for worker threads), `asearch` an
+    httpx.AsyncClient (for the event loop). Create one instance at startup and share it.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = SERPER_BASE_URL,
+        connect_timeout: float = SERPER_CONNECT_TIMEOUT,
+        read_timeout: float = SERPER_READ_TIMEOUT,
+        retries: int = SERPER_RETRIES,
+        backoff: float = SERPER_BACKOFF,
+        max_connections: int = SERPER_MAX_CONNECTIONS,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.retries = retries
+        self.backoff = backoff
+        self._timeout = (connect_timeout, read_timeout)
+
+        self._session = requests.Session()
+        # pool_block makes extra threads wait for a free connection instead of opening more
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections, pool_block=True)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+        self._async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    def _request_args(self, payload: dict, search_type: str):
+        if not self.api_key:
+            raise SerperError(400, "Serper API key not configured.")
+        url = f"{self.base_url}/{search_type}"
+        headers = {"X-API-KEY": self.api_key, "Content-Type": "application/json"}
+        return url, headers
+
+    def _delay(self, attempt: int) -> float:
+        # "full jitter": a random delay up to backoff * 2^attempt
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+    def search(self, payload: dict, search_type: str = "search") -> dict:
+        """
+        POST `payload` to Serper and return the JSON response (blocking).
+        """
+        url, headers = self._request_args(payload, search_type)
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self._delay(attempt - 1))
+            try:
+                response = self._session.post(url, json=payload, headers=headers, timeout=self._timeout)
+            except requests.Timeout:
+                error = SerperError(504, "Search API request timed out.")
+                continue
+            except requests.ConnectionError:
+                error = SerperError(502, "Could not connect to the Search API.")
+                continue
+            if response.status_code == 200:
+                record_serper_call()
+                return response.json()
+            error = SerperError(response.status_code, "Search API request failed.")
+            if response.status_code not in RETRY_STATUSES:
+                break
+        raise error
+
+    async def asearch(self, payload: dict, search_type: str = "search") -> dict:
+        """
+        Async version of `search`, for use on the server's event loop.
+        """
+        url, headers = self._request_args(payload, search_type)
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self._delay(attempt - 1))
+            try:
+                response = await self._async_client.post(url, json=payload, headers=headers)
+            except httpx.TimeoutException:
+                error = SerperError(504, "Search API request timed out.")
+                continue
+            except httpx.TransportError:
+                error = SerperError(502, "Could not connect to the Search API.")
+                continue
+            if response.status_code == 200:
+                record_serper_call()
+                return response.json()
+            error = SerperError(response.status_code, "Search API request failed.")
+            if response.status_code not in RETRY_STATUSES:
+                break
+        raise error
+
+    async def aclose(self):
+        self._session.close()
+        await self._async_client.aclose()
+
+
+# Shared client, created once when the app starts
+serper_client = SerperClient(api_key=os.getenv("SERPER_API_KEY"))
+
+
+class CachedSerperDevTool(SerperDevTool):
+    """
+    SerperDevTool that answers repeated queries from `search_cache` and sends the
+    rest through the shared, pooled `serper_client`. Like the parent, it rejects
+    unknown search types and treats an empty response as an error (never cached).
+    """
+
+    def _make_api_request(self, search_query: str, search_type: str) -> dict:
+        # same checks as SerperDevTool: unknown search types are rejected before the cache
+        self._get_search_url(search_type)
+        search_type = search_type.lower()
+        payload = {"q": search_query, "num": self.n_results}
+        if self.country:
+            payload["gl"] = self.country
+        if self.location:
+            payload["location"] = self.location
+        if self.locale:
+            payload["hl"] = self.locale
+
+        key = search_cache_key(search_type, payload)
+        results = search_cache.get(key)
+        if results is None:
+            results = serper_client.search(payload, search_type)
+            if not results:
+                raise ValueError("Empty response from Serper API")
+            search_cache.set(key, results)
+        return results
@@ -0,0 +1,38 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key onto one running call.
+
+    The first caller for a key starts `func()` as its own task; callers arriving
+    while it runs await the same task and get the same result (or exception).
+    The task is shielded, so one caller going away does not cancel the run for
+    the others.
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self._inflight = {}
+
+    async def do(self, key: str, func):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def is_running(self, key: str) -> bool:
+        return key in self._inflight
+
+    def _finish(self, key: str, task):
+        self._inflight.pop(key, None)
+        # mark the exception as retrieved even if every caller has gone away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {"running": len(self._inflight), "coalesced": self.coalesced}
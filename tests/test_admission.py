@@ -0,0 +1,99 @@
+"""
+AdmissionController: a full queue and the queue deadline answer 429 with
+Retry-After, waiters start in arrival order, and background work (wait=True)
+is queued instead of rejected.
+
+    python -m pytest tests/test_admission.py
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+from fastapi import HTTPException
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from admission import AdmissionController  # noqa: E402
+
+
+async def hold(admission, release, started=None, name=None, wait=False):
+    async def func():
+        if started is not None:
+            started.append(name)
+        await release.wait()
+        return name
+
+    return await admission.run(func, wait=wait)
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def scenario():
+        admission = AdmissionController(max_running=1, queue_size=1, queue_timeout=10)
+        release = asyncio.Event()
+        running = asyncio.create_task(hold(admission, release))
+        queued = asyncio.create_task(hold(admission, release))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as rejected:
+            await admission.run(lambda: asyncio.sleep(0))
+        release.set()
+        await asyncio.gather(running, queued)
+        return rejected.value, admission.stats()
+
+    error, stats = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert int(error.headers["Retry-After"]) >= 1
+    assert stats == {"running": 0, "queued": 0, "rejected": 1}
+
+
+def test_queue_deadline_is_rejected_and_frees_the_place():
+    async def scenario():
+        admission = AdmissionController(max_running=1, queue_size=5, queue_timeout=0.05)
+        release = asyncio.Event()
+        running = asyncio.create_task(hold(admission, release))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as rejected:
+            await admission.run(lambda: asyncio.sleep(0))
+        queued_after = admission.stats()["queued"]
+        release.set()
+        await running
+        return rejected.value, queued_after
+
+    error, queued_after = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert "Retry-After" in error.headers
+    assert queued_after == 0
+
+
+def test_waiters_start_in_arrival_order():
+    async def scenario():
+        admission = AdmissionController(max_running=1, queue_size=10, queue_timeout=10)
+        release = asyncio.Event()
+        started = []
+        tasks = []
+        for name in "abcd":
+            tasks.append(asyncio.create_task(hold(admission, release, started, name)))
+            await asyncio.sleep(0)
+        release.set()
+        return await asyncio.gather(*tasks), started
+
+    results, started = asyncio.run(scenario())
+    assert results == list("abcd")
+    assert started == list("abcd")
+
+
+def test_background_work_waits_past_the_queue_size_and_deadline():
+    async def scenario():
+        admission = AdmissionController(max_running=1, queue_size=0, queue_timeout=0.01)
+        release = asyncio.Event()
+        running = asyncio.create_task(hold(admission, release))
+        background = asyncio.create_task(hold(admission, release, name="job", wait=True))
+        await asyncio.sleep(0.05)
+        waiting = not background.done()
+        release.set()
+        return waiting, await background, await running
+
+    waiting, result, _ = asyncio.run(scenario())
+    assert waiting
+    assert result == "job"
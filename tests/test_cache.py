@@ -0,0 +1,70 @@
+"""
+SQLiteCache: entries expire after the TTL, the least recently used entries are
+evicted beyond max_entries, and a TTL of 0 turns the cache off.
+
+    python -m pytest tests/test_cache.py
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import cache  # noqa: E402
+from cache import SQLiteCache  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache, "time", clock)
+    return clock
+
+
+def test_entry_expires_after_ttl(tmp_path, clock):
+    store = SQLiteCache("results", ttl=60, max_entries=10, path=str(tmp_path / "cache.sqlite3"))
+    store.set("a", {"result": "x"})
+
+    clock.now += 59
+    assert store.get("a") == {"result": "x"}
+    assert store.ttl_left("a") == pytest.approx(1)
+
+    clock.now += 2
+    assert store.ttl_left("a") is None
+    assert store.get("a") is None
+    assert store.stats()["entries"] == 0
+    assert (store.hits, store.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path, clock):
+    store = SQLiteCache("results", ttl=3600, max_entries=2, path=str(tmp_path / "cache.sqlite3"))
+    store.set("a", 1)
+    clock.now += 1
+    store.set("b", 2)
+    clock.now += 1
+    assert store.get("a") == 1   # "a" is now more recently used than "b"
+    clock.now += 1
+    store.set("c", 3)
+
+    assert store.get("b") is None
+    assert store.get("a") == 1
+    assert store.get("c") == 3
+    assert store.stats()["entries"] == 2
+
+
+def test_zero_ttl_disables_the_cache(tmp_path):
+    store = SQLiteCache("results", ttl=0, max_entries=10, path=str(tmp_path / "cache.sqlite3"))
+    store.set("a", 1)
+
+    assert store.get("a") is None
+    assert store.stats()["entries"] == 0
@@ -0,0 +1,106 @@
+"""
+A running crew must not block the event loop: while the first /set_task is
+inside crew.kickoff(), a second /set_task and a CORS preflight are served.
+
+Crew.kickoff and the Serper client are stubbed, so no API keys or network
+are needed. Run from the repository root:
+
+    python -m pytest tests/test_concurrency.py
+"""
+import asyncio
+import importlib
+import os
+import sys
+import threading
+
+import httpx
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST = {"task_type": "Satun", "style": "Natural", "cost": "Low", "day": "2", "adults": "2", "Rq": ""}
+SECOND = dict(FIRST, task_type="Trang")
+TIMEOUT = 10
+
+
+@pytest.fixture(scope="module")
+def add_all(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp("trip")
+    (workdir / "static").mkdir()
+    environ = dict(os.environ)
+    cwd = os.getcwd()
+    os.environ.update({
+        "SERPER_API_KEY": "test",
+        "OPENAI_API_KEY": "test",
+        "CREWAI_DISABLE_TELEMETRY": "true",
+        "OTEL_SDK_DISABLED": "true",
+        "CACHE_PATH": str(workdir / "cache.sqlite3"),
+        "RESULT_CACHE_TTL": "0",
+        "SEARCH_CACHE_TTL": "0",
+        "RESEARCH_CACHE_TTL": "0",
+        "LLM_CACHE_TTL": "0",
+    })
+    os.chdir(workdir)  # add_all mounts ./static
+    sys.path.insert(0, ROOT)
+    try:
+        yield importlib.import_module("add_all")
+    finally:
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(environ)
+
+
+@pytest.fixture
+def blocking_crew(add_all, monkeypatch):
+    """
+    The first kickoff blocks until `release` is set; later ones return at once.
+    """
+    import crewai
+
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def kickoff(crew, inputs=None):
+        calls.append(crew)
+        if len(calls) == 1:
+            started.set()
+            assert release.wait(TIMEOUT), "first crew was never released"
+        return "## Package 1: Test\nA quiet beach day."
+
+    async def asearch(payload, search_type="search"):
+        return {"organic": [{"title": "Result", "link": "https://example.com"}]}
+
+    monkeypatch.setattr(crewai.Crew, "kickoff", kickoff)
+    monkeypatch.setattr(add_all.serper_client, "asearch", asearch)
+    return started, release
+
+
+def test_second_request_is_served_while_first_crew_runs(add_all, blocking_crew):
+    started, release = blocking_crew
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=add_all.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=TIMEOUT) as client:
+            first = asyncio.create_task(client.post("/set_task", json=FIRST))
+            assert await asyncio.to_thread(started.wait, TIMEOUT), "first crew did not start"
+
+            second = await asyncio.wait_for(client.post("/set_task", json=SECOND), TIMEOUT)
+            preflight = await asyncio.wait_for(client.options("/set_task", headers={
+                "Origin": "http://localhost:5500",
+                "Access-Control-Request-Method": "POST",
+            }), TIMEOUT)
+            first_still_running = not first.done()
+
+            release.set()
+            return await asyncio.wait_for(first, TIMEOUT), second, preflight, first_still_running
+
+    try:
+        first, second, preflight, first_still_running = asyncio.run(scenario())
+    finally:
+        release.set()
+
+    assert first_still_running
+    assert second.status_code == 200, second.text
+    assert preflight.status_code == 200
+    assert preflight.headers["access-control-allow-origin"]
+    assert first.status_code == 200, first.text
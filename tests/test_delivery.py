@@ -0,0 +1,78 @@
+"""
+deliver(): a content-hash ETag, 304 for a matching If-None-Match on GET, and
+the response encoding chosen from Accept-Encoding.
+
+    python -m pytest tests/test_delivery.py
+"""
+import gzip
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import delivery  # noqa: E402
+from delivery import choose_encoding, deliver  # noqa: E402
+
+RECORD = {"message": "Task completed!", "result": "<p>" + "beach day " * 200 + "</p>", "markdown": "beach day"}
+
+
+def get(**headers):
+    return SimpleNamespace(headers={name.replace("_", "-"): value for name, value in headers.items()})
+
+
+@pytest.fixture
+def no_brotli(monkeypatch):
+    monkeypatch.setattr(delivery, "brotli", None)
+
+
+def test_matching_if_none_match_returns_304():
+    etag = deliver(get(), RECORD, "html").headers["etag"]
+
+    assert deliver(get(if_none_match=etag), RECORD, "html").status_code == 304
+    assert deliver(get(if_none_match='W/"other", ' + etag), RECORD, "html").status_code == 304
+    assert deliver(get(if_none_match='"other"'), RECORD, "html").status_code == 200
+    # POST answers are never 304
+    assert deliver(get(if_none_match=etag), RECORD, "html", conditional=False).status_code == 200
+
+
+def test_compressed_etag_matches_the_plain_content(no_brotli):
+    plain = deliver(get(), RECORD, "html")
+    compressed = deliver(get(accept_encoding="gzip"), RECORD, "html")
+
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(compressed.body) == plain.body
+    assert compressed.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+    assert deliver(get(if_none_match=compressed.headers["etag"]), RECORD, "html").status_code == 304
+
+
+def test_small_bodies_are_not_compressed(no_brotli):
+    response = deliver(get(accept_encoding="gzip"), RECORD, "md")
+
+    assert "content-encoding" not in response.headers
+    assert response.body == b"beach day"
+
+
+def test_choose_encoding(no_brotli):
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0") is None
+    assert choose_encoding("*") == "gzip"
+    assert choose_encoding("*, gzip;q=0") is None
+    assert choose_encoding("identity") is None
+    assert choose_encoding(None) is None
+
+
+def test_choose_encoding_prefers_brotli(monkeypatch):
+    monkeypatch.setattr(delivery, "brotli", object())
+
+    assert choose_encoding("gzip, br") == "br"
+    assert choose_encoding("gzip, br;q=0") == "gzip"
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(delivery.HTTPException) as error:
+        deliver(get(), RECORD, "pdf")
+    assert error.value.status_code == 400
@@ -0,0 +1,42 @@
+"""
+The local knowledge index finds Thai passages from Thai queries (Thai has no
+spaces between words) and ships with a seed corpus, so the researcher gets the
+tool without any setup.
+
+    python -m pytest tests/test_knowledge_index.py
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from knowledge_index import KnowledgeIndex, tokenize  # noqa: E402
+
+
+def test_thai_text_is_split_into_bigrams():
+    assert tokenize("ทะเลน้อย") == ["ทะ", "ะเ", "เล", "ลน", "น้", "้อ", "อย"]
+    assert tokenize("Hotels in Trangตรัง") == ["hotels", "trang", "ตร", "รั", "ัง"]
+
+
+def test_thai_query_finds_the_thai_passage(tmp_path):
+    (tmp_path / "notes.md").write_text(
+        "พัทลุง: ทะเลน้อย นั่งเรือชมนกน้ำและทุ่งบัวแดงตอนเช้า\n\n"
+        "ตรัง: หมูย่างเมืองตรัง ติ่มซำมื้อเช้า\n\n"
+        "Songkhla: Samila Beach and the mermaid statue.\n",
+        encoding="utf-8",
+    )
+    (tmp_path / "user_preference.txt").write_text("User name is John Doe.", encoding="utf-8")
+    index = KnowledgeIndex(str(tmp_path), rescan_interval=0)
+
+    assert index.document_count() == 3
+    assert "ทะเลน้อย" in index.search("ทุ่งบัวแดง ทะเลน้อย", top_k=1)[0][2]
+    assert "หมูย่าง" in index.search("หมูย่างตรัง", top_k=1)[0][2]
+    assert "Samila" in index.search("mermaid in Songkhla", top_k=1)[0][2]
+
+
+def test_default_corpus_has_travel_notes():
+    index = KnowledgeIndex(rescan_interval=0)
+
+    assert index.document_count() > 0
+    assert "Betong" in index.search("สกายวอล์ก เบตง", top_k=1)[0][2]
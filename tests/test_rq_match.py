@@ -0,0 +1,64 @@
+"""
+RqIndex: an Rq written differently finds the cached result of the same Rq, but
+negation, different numbers or an added constraint never match, and a
+threshold of 0 turns matching off.
+
+    python -m pytest tests/test_rq_match.py
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from rq_match import RqIndex  # noqa: E402
+
+GROUP = "satun|natural|low|2|2"
+
+
+@pytest.fixture
+def index(tmp_path):
+    return RqIndex(threshold=0.8, path=str(tmp_path / "cache.sqlite3"))
+
+
+def matched_keys(index, rq, group=GROUP):
+    return [cache_key for _, cache_key, _ in index.matches(group, rq)]
+
+
+def test_rewording_matches(index):
+    index.add(GROUP, "Vegetarian food", "veg")
+    index.add(GROUP, "อาหารมังสวิรัติ", "veg-th")
+
+    assert matched_keys(index, "vegetarian  food please") == ["veg"]
+    assert matched_keys(index, "อาหารมังสวิรัติค่ะ") == ["veg-th"]
+    assert index.stats()["matches"] == 2
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("vegetarian food", "no vegetarian food"),
+    ("อาหารทะเล", "ไม่เอาอาหารทะเล"),
+    ("budget 5,000 THB", "budget 8,000 THB"),
+    ("allergic to peanuts", "allergic to peanuts and shellfish"),
+    ("allergic to peanuts and shellfish", "allergic to peanuts"),
+])
+def test_guards_reject_different_requests(index, cached, asked):
+    index.add(GROUP, cached, "cached")
+
+    assert matched_keys(index, asked) == []
+
+
+def test_other_groups_are_not_searched(index):
+    index.add(GROUP, "vegetarian food", "veg")
+
+    assert matched_keys(index, "vegetarian food", group="trang|natural|low|2|2") == []
+
+
+def test_zero_threshold_turns_matching_off(tmp_path):
+    index = RqIndex(threshold=0, path=str(tmp_path / "cache.sqlite3"))
+    index.add(GROUP, "vegetarian food", "veg")
+
+    assert not index.enabled
+    assert matched_keys(index, "vegetarian food") == []
+    assert index.stats()["entries"] == 0
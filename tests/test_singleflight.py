@@ -0,0 +1,80 @@
+"""
+SingleFlight: concurrent callers of one key share one run, a caller that is
+cancelled does not cancel the run for the others, and the key is freed once
+the run ends.
+
+    python -m pytest tests/test_singleflight.py
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from singleflight import SingleFlight  # noqa: E402
+
+
+def test_concurrent_callers_share_one_run():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+        runs = []
+
+        async def func():
+            runs.append(1)
+            await release.wait()
+            return "trip"
+
+        callers = [asyncio.create_task(flight.do("key", func)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        return await asyncio.gather(*callers), runs, flight
+
+    results, runs, flight = asyncio.run(scenario())
+    assert results == ["trip"] * 3
+    assert len(runs) == 1
+    assert flight.stats() == {"running": 0, "coalesced": 2}
+
+
+def test_cancelled_caller_does_not_cancel_the_run():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def func():
+            await release.wait()
+            return "trip"
+
+        leader = asyncio.create_task(flight.do("key", func))
+        follower = asyncio.create_task(flight.do("key", func))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        still_running = flight.is_running("key")
+        release.set()
+        return leader, await follower, still_running, flight
+
+    leader, result, still_running, flight = asyncio.run(scenario())
+    assert leader.cancelled()
+    assert still_running
+    assert result == "trip"
+    assert not flight.is_running("key")
+
+
+def test_failed_run_frees_the_key():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def fail():
+            raise ValueError("crew failed")
+
+        with pytest.raises(ValueError):
+            await flight.do("key", fail)
+        return flight.is_running("key"), await flight.do("key", lambda: asyncio.sleep(0, "retry"))
+
+    running, result = asyncio.run(scenario())
+    assert not running
+    assert result == "retry"
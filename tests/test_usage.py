@@ -0,0 +1,90 @@
+"""
+RequestUsage: a run stops with BudgetExceeded once the request or per-minute
+token budget is used up, crewAI retries are turned off, and the finished task
+outputs are kept as the partial result.
+
+The crews are stand-ins with the attributes RequestUsage reads, so no LLM is called.
+
+    python -m pytest tests/test_usage.py
+"""
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from usage import BudgetExceeded, RequestUsage, TokenWindow  # noqa: E402
+
+
+class FakeCrew:
+    def __init__(self, tasks: int = 2):
+        self.tasks = [object()] * tasks
+        self.agents = [SimpleNamespace(step_callback=None, max_retry_limit=2)]
+        self.task_callback = None
+        self.tokens = 0
+
+    def calculate_usage_metrics(self):
+        return SimpleNamespace(prompt_tokens=self.tokens, completion_tokens=0, successful_requests=1)
+
+    def tool_step(self):
+        self.agents[0].step_callback(SimpleNamespace(tool="Search the internet", text="searching"))
+
+    def finish_task(self, raw: str):
+        self.task_callback(SimpleNamespace(raw=raw))
+
+
+def test_request_budget_stops_the_next_step_and_keeps_finished_tasks():
+    usage = RequestUsage(budget=1000, per_minute=0, window=TokenWindow())
+    crew = usage.track(FakeCrew())
+
+    crew.tokens = 600
+    crew.finish_task("research findings")
+    crew.tokens = 1100
+    with pytest.raises(BudgetExceeded) as stopped:
+        crew.tool_step()
+
+    assert stopped.value.budget == "request"
+    assert crew.agents[0].max_retry_limit == 0
+    assert usage.partial_result() == "research findings"
+    assert usage.summary()["budget_exceeded"] == "request"
+    assert usage.summary()["total_tokens"] == 1100
+    # later crews of the same request do not start
+    with pytest.raises(BudgetExceeded):
+        usage.track(FakeCrew())
+
+
+def test_budget_is_checked_before_the_next_task():
+    usage = RequestUsage(budget=1000, per_minute=0, window=TokenWindow())
+    crew = usage.track(FakeCrew(tasks=2))
+
+    crew.tokens = 1200
+    with pytest.raises(BudgetExceeded):
+        crew.finish_task("research findings")
+    assert usage.partial_result() == "research findings"
+
+
+def test_per_minute_budget_is_shared_by_requests():
+    window = TokenWindow()
+    first = RequestUsage(budget=0, per_minute=1000, window=window)
+    second = RequestUsage(budget=0, per_minute=1000, window=window)
+    first_crew, second_crew = first.track(FakeCrew()), second.track(FakeCrew())
+
+    first_crew.tokens = 600
+    first_crew.tool_step()
+    second_crew.tokens = 500
+    with pytest.raises(BudgetExceeded) as stopped:
+        second_crew.tool_step()
+    assert stopped.value.budget == "minute"
+
+
+def test_no_budget_never_stops():
+    usage = RequestUsage(budget=0, per_minute=0, window=TokenWindow())
+    crew = usage.track(FakeCrew())
+
+    crew.tokens = 10 ** 9
+    crew.tool_step()
+    crew.finish_task("packages")
+    assert usage.summary()["budget_exceeded"] is None
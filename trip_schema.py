@@ -0,0 +1,94 @@
+import os
+import re
+from typing import Optional
+
+from pydantic import BaseModel, Field, ValidationError
+
+# ---------- Structured output settings ----------
+# 1 = the writer fills TripPlan (JSON) instead of free-form Markdown; the API returns it as "packages"
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "0").lower() in ("1", "true", "yes")
+
+
+class Activity(BaseModel):
+    time: str = Field(description='Time of day, e.g. "08:00" or "Morning"')
+    name: str = Field(description="Place or activity name")
+    description: str = Field(description="What to do there and why it fits the trip")
+    cost_thb: Optional[int] = Field(default=None, description="Approximate cost per person in THB")
+
+
+class Day(BaseModel):
+    day: int = Field(description="Day number, starting at 1")
+    title: str
+    activities: list[Activity]
+
+
+class Package(BaseModel):
+    name: str
+    summary: str
+    days: list[Day]
+    accommodations: list[str] = Field(description="Recommended accommodation names")
+    signature_dish: str = Field(description="Local food or signature dish to try")
+    total_cost_thb: Optional[int] = Field(default=None, description="Approximate total cost per person in THB")
+
+
+class TripPlan(BaseModel):
+    """
+    Output of the writer in structured mode: five packages → days → activities.
+    """
+    packages: list[Package] = Field(description="Exactly 5 travel packages")
+
+
+def plan_markdown(plan: TripPlan) -> str:
+    """
+    Markdown of a TripPlan for the html/md formats. Package headings keep the
+    "Package N: <name>" form that Page_3.html puts the pictures in front of.
+    """
+    return "\n".join(
+        package_markdown(number, package) for number, package in enumerate(plan.packages, start=1)
+    ).strip() + "\n"
+
+
+def package_markdown(number: int, package: Package) -> str:
+    lines = [f"## Package {number}: {package.name}", "", package.summary, ""]
+    for day in package.days:
+        lines += [f"### Day {day.day}: {day.title}", ""]
+        for activity in day.activities:
+            cost = f" (~{activity.cost_thb:,} THB)" if activity.cost_thb is not None else ""
+            lines.append(f"- **{activity.time}** {activity.name}{cost}: {activity.description}")
+        lines.append("")
+    lines.append(f"**Accommodation:** {', '.join(package.accommodations)}")
+    lines.append("")
+    lines.append(f"**Signature dish:** {package.signature_dish}")
+    if package.total_cost_thb is not None:
+        lines += ["", f"**Estimated cost:** ~{package.total_cost_thb:,} THB per person"]
+    lines.append("")
+    return "\n".join(lines)
+
+
+def parse_package(result) -> Optional[Package]:
+    """
+    The Package of a crew result: its parsed `pydantic`, or the JSON object in its raw
+    text (e.g. inside a ```json fence) if that validates. None if neither does.
+    """
+    package = getattr(result, "pydantic", None)
+    if isinstance(package, Package):
+        return package
+    match = re.search(r"\{.*\}", str(getattr(result, "raw", result)), re.DOTALL)
+    if match:
+        try:
+            return Package.model_validate_json(match.group(0))
+        except ValidationError:
+            pass
+    return None
+
+
+def writer_output(result) -> tuple:
+    """
+    (markdown, packages) of a crew result or a TripPlan. `packages` is the TripPlan as a list
+    of dicts, or None when the writer answered in Markdown (structured mode off,
+    or its JSON could not be parsed).
+    """
+    plan = result if isinstance(result, TripPlan) else getattr(result, "pydantic", None)
+    if isinstance(plan, TripPlan):
+        return plan_markdown(plan), plan.model_dump()["packages"]
+    return str(getattr(result, "raw", result)), None
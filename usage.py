@@ -0,0 +1,205 @@
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from metrics import Counter
+
+# ---------- Token budget settings (0 = no limit) ----------
+TOKEN_BUDGET_PER_REQUEST = int(os.getenv("TOKEN_BUDGET_PER_REQUEST", "0"))
+TOKEN_BUDGET_PER_MINUTE = int(os.getenv("TOKEN_BUDGET_PER_MINUTE", "0"))   # shared by all requests
+
+LLM_TOKENS = Counter("trip_llm_tokens_total", "LLM tokens spent by crews.", ["kind"])
+LLM_CALLS = Counter("trip_llm_calls_total", "Successful LLM calls made by crews.")
+TOOL_CALLS = Counter("trip_tool_calls_total", "Tool calls made by agents.", ["tool"])
+SERPER_CALLS = Counter("trip_serper_calls_total", "Requests sent to the Serper API (cache misses).")
+BUDGET_STOPS = Counter("trip_budget_stops_total", "Runs stopped early by a token budget.", ["budget"])
+
+# Usage of the request being handled; copied into the crew threads by run_blocking
+current_usage = ContextVar("current_usage", default=None)
+
+
+class BudgetExceeded(Exception):
+    def __init__(self, budget: str):
+        super().__init__(f"Token budget exceeded ({budget})")
+        self.budget = budget
+
+
+class TokenWindow:
+    """
+    Tokens spent by all requests in the last `seconds` seconds.
+    """
+
+    def __init__(self, seconds: float = 60):
+        self.seconds = seconds
+        self._lock = threading.Lock()
+        self._events = deque()
+        self._total = 0
+
+    def add(self, tokens: int):
+        with self._lock:
+            self._events.append((time.monotonic(), tokens))
+            self._total += tokens
+
+    def total(self) -> int:
+        deadline = time.monotonic() - self.seconds
+        with self._lock:
+            while self._events and self._events[0][0] < deadline:
+                self._total -= self._events.popleft()[1]
+            return self._total
+
+
+token_window = TokenWindow()
+
+
+class RequestUsage:
+    """
+    Token, tool and Serper accounting for one trip request, with optional budgets.
+
+    Every crew of the request is registered with `track()` (run_crew does this
+    for the current request). Agent steps refresh the token counts from the
+    crews' usage metrics; once a budget is exceeded the next step raises
+    BudgetExceeded, which ends the crew, and the finished task outputs are kept
+    as the partial result.
+    """
+
+    def __init__(self, budget: int = TOKEN_BUDGET_PER_REQUEST, per_minute: int = TOKEN_BUDGET_PER_MINUTE,
+                 window: TokenWindow = token_window):
+        self.budget = budget
+        self.per_minute = per_minute
+        self.window = window
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.llm_calls = 0
+        self.tool_calls = 0
+        self.serper_calls = 0
+        self.exceeded = None
+        self.outputs = []
+        self.last_step = ""
+        self._crews = []
+        self._tasks_total = 0
+        self._tasks_done = 0
+        self._lock = threading.RLock()
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def track(self, crew):
+        """
+        Count the crew's usage towards this request and hook its callbacks.
+        """
+        with self._lock:
+            self.check()
+            self._crews.append(crew)
+            self._tasks_total += len(crew.tasks)
+        for agent in crew.agents:
+            agent.step_callback = self._step_callback(agent.step_callback)
+        crew.task_callback = self._task_callback(crew.task_callback)
+        return crew
+
+    def _step_callback(self, then):
+        def callback(step):
+            tool = getattr(step, "tool", None)
+            if tool:
+                with self._lock:
+                    self.tool_calls += 1
+                TOOL_CALLS.inc(tool=tool)
+            text = getattr(step, "text", None) or getattr(step, "result", None)
+            if text:
+                self.last_step = str(text)
+            if then is not None:
+                then(step)
+            self.refresh()
+            # a final answer ends the task anyway; the task callback decides about the next one
+            if tool:
+                self.check()
+        return callback
+
+    def _task_callback(self, then):
+        def callback(output):
+            with self._lock:
+                self.outputs.append(str(getattr(output, "raw", output)))
+                self._tasks_done += 1
+                more_tasks = self._tasks_done < self._tasks_total
+            if then is not None:
+                then(output)
+            self.refresh()
+            # stop before the next task starts instead of after its first LLM call
+            if more_tasks:
+                self.check()
+        return callback
+
+    def record_serper_call(self):
+        with self._lock:
+            self.serper_calls += 1
+
+    def refresh(self):
+        """
+        Re-read the token counts of the tracked crews and add the increase to the window.
+        """
+        with self._lock:
+            prompt = completion = calls = 0
+            for crew in self._crews:
+                metrics = crew.calculate_usage_metrics()
+                prompt += metrics.prompt_tokens
+                completion += metrics.completion_tokens
+                calls += metrics.successful_requests
+            new_prompt = prompt - self.prompt_tokens
+            new_completion = completion - self.completion_tokens
+            new_calls = calls - self.llm_calls
+            self.prompt_tokens, self.completion_tokens, self.llm_calls = prompt, completion, calls
+        if new_prompt or new_completion:
+            self.window.add(new_prompt + new_completion)
+            LLM_TOKENS.inc(new_prompt, kind="prompt")
+            LLM_TOKENS.inc(new_completion, kind="completion")
+        if new_calls:
+            LLM_CALLS.inc(new_calls)
+
+    def check(self):
+        """
+        Raise BudgetExceeded if the request or the per-minute budget is used up.
+        """
+        with self._lock:
+            if self.exceeded is None:
+                if self.budget and self.total_tokens >= self.budget:
+                    self.exceeded = "request"
+                elif self.per_minute and self.window.total() >= self.per_minute:
+                    self.exceeded = "minute"
+                else:
+                    return
+                BUDGET_STOPS.inc(budget=self.exceeded)
+                # crewAI retries a failed task by running the agent again; that would
+                # spend more tokens, so turn retries off once the budget is gone
+                for crew in self._crews:
+                    for agent in crew.agents:
+                        agent.max_retry_limit = 0
+        raise BudgetExceeded(self.exceeded)
+
+    def partial_result(self) -> str:
+        """
+        Outputs of the tasks that finished, or the last agent step if none did.
+        """
+        return "\n\n".join(self.outputs) or self.last_step
+
+    def summary(self) -> dict:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "llm_calls": self.llm_calls,
+            "tool_calls": self.tool_calls,
+            "serper_calls": self.serper_calls,
+            "budget_exceeded": self.exceeded,
+        }
+
+
+def record_serper_call():
+    """
+    Count one request sent to Serper, for the metrics and the current request.
+    """
+    SERPER_CALLS.inc()
+    usage = current_usage.get()
+    if usage is not None:
+        usage.record_serper_call()